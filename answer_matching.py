@@ -0,0 +1,144 @@
+# Description: This module contains the typo-tolerant answer matching engine.
+#
+# The answers are compared after a stronger normalization than normalize()
+# in services_quiz_engine: Unicode NFKC form, case folding, one kind of
+# apostrophe (ʼ ’ ‘ ` ´ → ') and one kind of hyphen (‐ – — → -).
+# A card can accept several answers separated by "|" (the separator of the
+# deck files too); "/" and ";" are parts of answers like "TCP/IP".
+# An answer which is not exact, but is within a small Damerau-Levenshtein
+# distance of an accepted one (for example "interfase" for "interface")
+# is a "near miss".
+#
+# The AnswerIndex class keeps the normalized accepted answers of every card
+# of a deck, so grading an answer only normalizes the user's input and
+# runs a distance check limited to a narrow band.
+
+
+import unicodedata
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional, Tuple
+
+
+EXACT = "exact"
+NEAR = "near"
+WRONG = "wrong"
+
+_APOSTROPHES = "ʼ’‘`´′ʹ"
+_HYPHENS = "‐‑‒–—―−"
+_TRANSLATE = str.maketrans({**{c: "'" for c in _APOSTROPHES}, **{c: "-" for c in _HYPHENS}})
+ANSWER_SEPARATOR = "|"  # The same as deck_format.ANSWER_SEPARATOR
+
+
+@dataclass
+class MatchConfig:
+    max_distance: int = 2           # The biggest distance for a near miss
+    chars_per_typo: int = 5         # One typo is allowed for every this many characters
+    min_length: int = 4             # Shorter answers must be exact
+    transpositions: bool = True     # Count swapped neighbour letters as one typo (Damerau)
+    near_miss_is_correct: bool = True  # Count near misses as correct answers
+
+
+def normalize_answer(s: str) -> str:
+    """
+    The function normalizes an answer for matching: NFKC form, case folding,
+    the same apostrophe and hyphen characters and single spaces between words.
+    """
+    s = unicodedata.normalize("NFKC", s).casefold().translate(_TRANSLATE)
+    return " ".join(s.split())
+
+
+def split_answers(answer: str) -> Tuple[str, ...]:
+    """
+    The function returns the accepted answers of a card, for example
+    "макет | план" gives ("макет", "план").
+    """
+    parts = [part.strip() for part in answer.split(ANSWER_SEPARATOR)]
+    return tuple(part for part in parts if part) or (answer.strip(),)
+
+
+def bounded_distance(a: str, b: str, limit: int, transpositions: bool = True) -> int:
+    """
+    The function returns the Damerau-Levenshtein (optimal string alignment)
+    distance between a and b, or limit + 1 if it is bigger than limit.
+
+    Only the cells within "limit" of the diagonal are computed and the
+    computation stops as soon as a whole row is over the limit, so the
+    cost is O(len * limit) instead of O(len * len).
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    if a == b:
+        return 0
+    over = limit + 1
+    n, m = len(a), len(b)
+    prev2 = None
+    prev = [j if j <= limit else over for j in range(m + 1)]
+    for i in range(1, n + 1):
+        cur = [over] * (m + 1)
+        if i <= limit:
+            cur[0] = i
+        lo = max(1, i - limit)
+        hi = min(m, i + limit)
+        row_min = cur[0]
+        ca = a[i - 1]
+        for j in range(lo, hi + 1):
+            cost = 0 if ca == b[j - 1] else 1
+            d = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if transpositions and prev2 is not None and j > 1 and ca == b[j - 2] and a[i - 2] == b[j - 1]:
+                d = min(d, prev2[j - 2] + 1)
+            cur[j] = d if d <= limit else over
+            if cur[j] < row_min:
+                row_min = cur[j]
+        if row_min > limit:
+            return over
+        prev2, prev = prev, cur
+    return prev[m]
+
+
+class AnswerIndex:
+    """
+    The precomputed index of the accepted answers of a deck.
+
+    For every answer string of the cards it keeps the normalized accepted
+    answers, so they are computed once per deck and not on every answer.
+    """
+
+    def __init__(self, answers: Iterable[str] = (), config: Optional[MatchConfig] = None):
+        self.config = config or MatchConfig()
+        self._forms: Dict[str, Tuple[str, ...]] = {}
+        for answer in answers:
+            self.forms(answer)
+
+    def forms(self, answer: str) -> Tuple[str, ...]:
+        """
+        Return the normalized accepted answers of the card answer.
+        """
+        forms = self._forms.get(answer)
+        if forms is None:
+            forms = self._forms[answer] = tuple(normalize_answer(a) for a in split_answers(answer))
+        return forms
+
+    def allowed_typos(self, form: str) -> int:
+        """
+        Return how many typos are allowed in an answer like form.
+        """
+        config = self.config
+        if len(form) < config.min_length:
+            return 0
+        return min(config.max_distance, max(1, len(form) // config.chars_per_typo))
+
+    def grade(self, user: str, answer: str) -> str:
+        """
+        Grade the user's input against the card answer: EXACT, NEAR or WRONG.
+        """
+        forms = self.forms(answer)
+        user = normalize_answer(user)
+        if user in forms:
+            return EXACT
+        if not user:
+            return WRONG
+        for form in forms:
+            limit = self.allowed_typos(form)
+            if limit and bounded_distance(user, form, limit, self.config.transpositions) <= limit:
+                return NEAR
+        return WRONG
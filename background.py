@@ -0,0 +1,231 @@
+# Description: This module contains a helper to run slow work (for example,
+# reading a big CSV file) in a background thread without freezing Tkinter.
+# Tkinter widgets may only be touched from the main thread, so the worker
+# thread only puts messages into a queue, and the main thread reads the queue
+# with widget.after() and calls the callbacks.
+#
+# run_in_background() starts one thread for one long job with progress,
+# TkWorker is a single long-living worker thread for many short jobs
+# (disk I/O, grading, preparing decks) which run in the order they are given.
+# LatencyProbe measures how long the window stays busy after the user's input.
+# StartupTimer measures the time to the first frame and the screen transitions.
+
+
+import queue
+import threading
+import time
+
+
+def run_in_background(widget, work, on_done=None, on_progress=None, on_error=None, poll_ms=50):
+    """
+    Run work(report) in a daemon thread and call the callbacks in the Tk main loop.
+
+    Parameters:
+        widget: any Tkinter widget, its after() method is used for polling.
+        work: function which accepts one argument report(*args); it can call
+            report() from the worker thread to send the progress.
+        on_done(value): called with the value returned by work.
+        on_progress(*args): called with the arguments given to report().
+        on_error(exc): called with the exception raised by work.
+        poll_ms: how often the queue is checked, in milliseconds.
+
+    Only the latest progress message is delivered on each poll, so a fast
+    worker can not flood the event loop.
+    """
+    messages = queue.Queue()
+
+    def target():
+        try:
+            value = work(lambda *args: messages.put(("progress", args)))
+        except Exception as exc:
+            messages.put(("error", exc))
+        else:
+            messages.put(("done", value))
+
+    def poll():
+        progress = None
+        while True:
+            try:
+                kind, payload = messages.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "progress":
+                progress = payload
+                continue
+            if progress is not None and on_progress:
+                on_progress(*progress)
+            if kind == "done":
+                if on_done:
+                    on_done(payload)
+            elif on_error:
+                on_error(payload)
+            else:
+                raise payload
+            return
+        if progress is not None and on_progress:
+            on_progress(*progress)
+        widget.after(poll_ms, poll)
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    widget.after(poll_ms, poll)
+    return thread
+
+
+class TkWorker:
+    """
+    One background thread which runs jobs one after another.
+
+    Because the jobs run in the order of submit() on the same thread, the
+    objects used only inside jobs (the results store, the scheduler) need
+    no locks. The callbacks are called in the Tk main loop, the queue of
+    results is polled with widget.after() only while some jobs are pending.
+    """
+
+    def __init__(self, widget, poll_ms=15):
+        self.widget = widget
+        self.poll_ms = poll_ms
+        self._jobs = queue.Queue()
+        self._results = queue.Queue()
+        self._pending = 0           # Jobs without delivered results, changed only in the main thread
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                return
+            fn, args, on_done, on_error = job
+            try:
+                value = fn(*args)
+            except Exception as exc:
+                self._results.put((on_error, exc, True))
+            else:
+                self._results.put((on_done, value, False))
+
+    def submit(self, fn, *args, on_done=None, on_error=None):
+        """
+        Run fn(*args) in the worker thread; then call on_done(value) or
+        on_error(exc) in the main thread. Without on_error the exception is
+        raised in the main loop, so it is reported like any Tk callback error.
+        """
+        self._jobs.put((fn, args, on_done, on_error))
+        self._pending += 1
+        if self._pending == 1:
+            self.widget.after(self.poll_ms, self._poll)
+
+    def _poll(self):
+        # The next poll is scheduled even if a callback (or a job without
+        # on_error) raises, otherwise the results of the other pending jobs
+        # would never be delivered
+        try:
+            while True:
+                try:
+                    callback, value, failed = self._results.get_nowait()
+                except queue.Empty:
+                    break
+                self._pending -= 1
+                if callback is not None:
+                    callback(value)
+                elif failed:
+                    raise value
+        finally:
+            if self._pending:
+                self.widget.after(self.poll_ms, self._poll)
+
+    def shutdown(self, timeout=None):
+        """
+        Let the worker finish the submitted jobs and stop it.
+        The callbacks of the jobs finished after this call are not called.
+        """
+        self._jobs.put(None)
+        self._thread.join(timeout)
+
+
+class LatencyProbe:
+    """
+    Measures the input-to-frame latency: the time from the start of an
+    event handler to the moment Tk becomes idle again, i.e. after the
+    handler and the redraw of the changed widgets.
+
+    Usage: command=probe.wrap("submit", self.submit_answer). The time is
+    taken in an idle callback registered after the handler, so it runs after
+    the redraws the handler caused (Tk runs idle callbacks in order).
+    """
+
+    def __init__(self, widget):
+        self.widget = widget
+        self.samples = {}   # Event name -> list of seconds
+
+    def wrap(self, name, handler):
+        """
+        Return the handler which measures the latency of every call of handler.
+        """
+        def wrapped(*args):
+            started = time.perf_counter()
+            value = handler(*args)
+            self.widget.after_idle(lambda: self.widget.after_idle(lambda: self._record(name, started)))
+            return value
+        return wrapped
+
+    def _record(self, name, started):
+        self.samples.setdefault(name, []).append(time.perf_counter() - started)
+
+    def summary(self):
+        """
+        Return the lines "name: count, median, p95, max" in milliseconds.
+        """
+        lines = []
+        for name, samples in sorted(self.samples.items()):
+            ordered = sorted(samples)
+            median = ordered[len(ordered) // 2] * 1000
+            p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000
+            lines.append(f"{name}: {len(ordered)} events, median {median:.1f} ms, p95 {p95:.1f} ms, max {ordered[-1] * 1000:.1f} ms")
+        return "\n".join(lines)
+
+
+class StartupTimer:
+    """
+    Measures the start of the application and the screen transitions.
+
+    mark(name) remembers the time since the start (for example, when the
+    imports are done or the Home screen is built), first_frame() and
+    transition(name) measure the time until the window is drawn, in the
+    same way as LatencyProbe: in an idle callback after the redraws.
+    """
+
+    def __init__(self, widget, started=None):
+        self.widget = widget
+        self.started = time.perf_counter() if started is None else started
+        self.marks = []         # (name, seconds since the start)
+        self.transitions = {}   # Screen name -> list of seconds
+
+    def mark(self, name):
+        self.marks.append((name, time.perf_counter() - self.started))
+
+    def _when_drawn(self, callback):
+        self.widget.after_idle(lambda: self.widget.after_idle(callback))
+
+    def first_frame(self):
+        """
+        Mark the moment the first frame of the window is drawn.
+        """
+        self._when_drawn(lambda: self.mark("first frame"))
+
+    def transition(self, name):
+        """
+        Measure the transition to the screen from now until it is drawn.
+        """
+        started = time.perf_counter()
+        self._when_drawn(lambda: self.transitions.setdefault(name, []).append(time.perf_counter() - started))
+
+    def summary(self):
+        """
+        Return the marks and the transitions in milliseconds.
+        """
+        lines = [f"{name}: {seconds * 1000:.1f} ms" for name, seconds in self.marks]
+        for name, samples in sorted(self.transitions.items()):
+            average = sum(samples) / len(samples) * 1000
+            lines.append(f"-> {name}: {len(samples)} times, average {average:.1f} ms, max {max(samples) * 1000:.1f} ms")
+        return "\n".join(lines)
@@ -0,0 +1,495 @@
+# Description: This module contains benchmarks for the data loading code.
+# It generates a synthetic CSV file with the same columns as data/WordCards.csv
+# and compares the old pair of functions get_topics_English_to_Ukranian() and
+# get_topics_Ukranian_to_English() with the TopicCatalog the application uses,
+# and the cold (no sidecar index) and warm (valid index) start of the catalog.
+# It also compares grading answers one by one (the old run_quiz_round loop)
+# with the batch grading API, and the memory and build time of a list of
+# plain dataclass cards with the column-backed Deck, and load-tests the
+# asyncio AsyncQuizEngine with many concurrent sessions.
+#
+# The "suite" command is the reproducible benchmark of the whole
+# load -> deck -> grade -> save pipeline: for every size of synthetic
+# vocabulary (10^3 ... 10^7 rows) and results history it times each stage,
+# measures its peak memory with tracemalloc, writes the results as JSON and
+# compares them with a stored baseline to catch regressions. The stages are
+# timed in several passes and the best time of each is kept, and the stages
+# bound by the disk are compared by memory only, so the check is not upset
+# by a busy machine. It does not
+# need Tkinter or a display.
+#
+# Usage:
+#   python benchmark.py compare --rows 500000
+#   python benchmark.py suite --sizes 1000 10000 100000 --json results.json
+#   python benchmark.py suite --save-baseline benchmark_baseline.json
+#   python benchmark.py suite --baseline benchmark_baseline.json --tolerance 0.3
+
+
+import argparse
+import asyncio
+import csv
+import gc
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from data_handler import (
+    CATALOG_SUFFIX, TopicCatalog, get_topics_English_to_Ukranian, get_topics_Ukranian_to_English,
+)
+from deck_format import DECK_SUFFIX, DeckFile, import_csv
+from results_store import ResultsStore
+from services_quiz_engine import AsyncQuizEngine, Card, grade_batch, grade_columns, make_deck, normalize, run_quiz_round
+
+
+def make_synthetic_csv(path, rows, topics=100, seed=0):
+    """
+    Write a CSV file with "rows" cards spread over "topics" topics.
+    The words are random, but the same seed always gives the same file.
+    The words are made of a pool of random stems and the row number, so
+    even files of 10^7 rows are written quickly and every word is unique.
+    """
+    rnd = random.Random(seed)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    cyrillic = "абвгдежзиклмнопрстуфхцчшщюя"
+    pool = min(rows, 5000) or 1
+    eng_stems = ["".join(rnd.choice(letters) for _ in range(rnd.randint(4, 10))) for _ in range(pool)]
+    ukr_stems = ["".join(rnd.choice(cyrillic) for _ in range(rnd.randint(4, 10))) for _ in range(pool)]
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["eng_word", "ukr_word", "topic"])
+        writer.writerows(
+            (f"{eng_stems[rnd.randrange(pool)]}{i}", f"{ukr_stems[rnd.randrange(pool)]}{i}", f"Topic {i % topics}")
+            for i in range(rows)
+        )
+
+
+def make_results_history(results_dir, entries, topics=100, seed=0):
+    """
+    Write a results history of "entries" rounds over "topics" topics in the
+    format of ResultsStore, and the old saved_result.json with the last
+    result of every topic (for the legacy read-modify-write stages).
+    """
+    rnd = random.Random(seed)
+    os.makedirs(results_dir, exist_ok=True)
+    start = datetime(2025, 1, 1)
+    latest = {}
+    with open(os.path.join(results_dir, "history.jsonl"), "w", encoding="utf-8") as f:
+        for i in range(entries):
+            topic = f"Topic {rnd.randrange(topics)}"
+            entry = {"topic": topic, "date": (start + timedelta(minutes=i)).isoformat(), "correct": rnd.randint(0, 20), "total": 20}
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            latest[topic] = entry
+    legacy = {
+        topic: {"Дата": datetime.fromisoformat(e["date"]).strftime("%d.%m.%Y"), "Результат": f"Правильних відповідей {e['correct']}/{e['total']}."}
+        for topic, e in latest.items()
+    }
+    with open(os.path.join(results_dir, "saved_result.json"), "w", encoding="utf-8") as f:
+        json.dump(legacy, f, ensure_ascii=False, indent=4)
+
+
+def measure(fn, setup=None, repeat=1, memory=True):
+    """
+    Call fn() and return (seconds, peak bytes, retained bytes).
+    The retained bytes is the memory still used by the returned value.
+
+    The time is measured in separate calls without tracemalloc, because
+    tracing every allocation slows the code down a lot; with repeat > 1 it
+    is the best of "repeat" calls, which is the least disturbed by the other
+    work of the machine. Without memory the memory is not measured (0, 0).
+    setup() (if given) is called before every call to restore the same state.
+    """
+    seconds = float("inf")
+    for _ in range(repeat):
+        if setup:
+            setup()
+        gc.collect()
+        start = time.perf_counter()
+        value = fn()
+        seconds = min(seconds, time.perf_counter() - start)
+        del value
+    if not memory:
+        return seconds, 0, 0
+
+    if setup:
+        setup()
+    gc.collect()
+    tracemalloc.start()
+    value = fn()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del value
+    return seconds, peak, retained
+
+
+def bench_loaders(path):
+    """
+    Compare loading both directions of every topic with the old pair of
+    functions and with the TopicCatalog (one scan, one DeckIndex per topic).
+    """
+    def legacy():
+        return get_topics_English_to_Ukranian(path), get_topics_Ukranian_to_English(path)
+
+    def catalog():
+        topics = TopicCatalog(path, cache_size=10 ** 9)
+        topics.scan()
+        return topics, [(topics.english_to_ukranian(t), topics.ukranian_to_english(t)) for t in topics.names()]
+
+    return {"get_topics_* pair": measure(legacy), "TopicCatalog": measure(catalog)}
+
+
+def bench_catalog(path):
+    """
+    Compare the cold start of the catalog (the file is scanned and the
+    sidecar index is saved), the warm start (the index is valid) and the
+    start after the CSV file was touched (the index is checked by its hash).
+    """
+    catalog_file = path + CATALOG_SUFFIX
+
+    def drop_index():
+        if os.path.exists(catalog_file):
+            os.remove(catalog_file)
+
+    def touch():
+        TopicCatalog.open(path)
+        os.utime(path)
+
+    return {
+        "cold (scan and save index)": measure(lambda: TopicCatalog.open(path), setup=drop_index),
+        "warm (mtime match)": measure(lambda: TopicCatalog.open(path)),
+        "touched (hash match)": measure(lambda: TopicCatalog.open(path), setup=touch),
+    }
+
+
+def bench_deck_format(path):
+    """
+    Compare loading both directions of every topic from the CSV file and
+    from the columnar deck file; the sizes of the files are in the names.
+    """
+    deck_file = path + DECK_SUFFIX
+    import_csv(path, deck_file)
+
+    def load_deck():
+        deck = DeckFile.open(deck_file)
+        for topic in deck.names():
+            deck.english_to_ukranian(topic)
+            deck.ukranian_to_english(topic)
+
+    results = {
+        f"CSV ({os.path.getsize(path) // 1024} KB)": measure(lambda: (get_topics_English_to_Ukranian(path), get_topics_Ukranian_to_English(path))),
+        f"deck file ({os.path.getsize(deck_file) // 1024} KB)": measure(load_deck),
+    }
+    os.remove(deck_file)
+    return results
+
+
+def bench_grading(cards, learners, workers):
+    """
+    Grade "learners" answer sheets for a deck of "cards" cards with the old
+    per-item loop (normalizing both strings of every pair), with
+    grade_batch() and with grade_columns() in one and in several processes.
+    """
+    rnd = random.Random(1)
+    deck = [Card(f"word{i}", f"Слово {i}") for i in range(cards)]
+    columns = [[card.answer if rnd.random() < 0.7 else "x" for card in deck] for _ in range(learners)]
+
+    def legacy():
+        correct = 0
+        for column in columns:
+            for card, user in zip(deck, column):
+                if normalize(user) == normalize(card.answer):
+                    correct += 1
+        return correct
+
+    def fresh_deck():
+        # The normalized answers are cached on the cards, drop them for a fair run
+        for card in deck:
+            card._normalized = None
+
+    results = {
+        "per-item loop": measure(legacy),
+        "grade_batch": measure(lambda: [grade_batch(deck, column) for column in columns], setup=fresh_deck),
+        "grade_columns": measure(lambda: grade_columns(deck, columns), setup=fresh_deck),
+    }
+    if workers > 1:
+        name = f"grade_columns, {workers} procs"
+        results[name] = measure(lambda: grade_columns(deck, columns, workers=workers), setup=fresh_deck)
+    return results
+
+
+@dataclass
+class LegacyCard:
+    """
+    The Card class as it was before the Deck: a plain dataclass with __dict__.
+    """
+    prompt: str
+    answer: str
+
+
+def bench_decks(cards):
+    """
+    Compare building and shuffling a deck of "cards" cards (and the replay
+    of a half of them) as a list of plain dataclass objects and as a Deck.
+    """
+    topic = {f"word{i}": f"слово{i}" for i in range(cards)}
+
+    def legacy():
+        deck = [LegacyCard(k, v) for k, v in topic.items()]
+        random.shuffle(deck)
+        wrong = [card for i, card in enumerate(deck) if i % 2]
+        return deck, wrong
+
+    def columns():
+        deck = make_deck(topic)
+        wrong = deck.subset(range(1, len(deck), 2))
+        return deck, wrong
+
+    return {"list of dataclass cards": measure(legacy), "Deck (columns + order)": measure(columns)}
+
+
+def bench_sessions(sessions, cards):
+    """
+    Load test of AsyncQuizEngine: open "sessions" sessions at the same time
+    on one topic of "cards" cards, answer every card of every session
+    (a quarter of the answers are wrong) and finish them.
+
+    Returns (sessions per second, bytes per open session).
+    """
+    topic = {f"word{i}": f"слово{i}" for i in range(cards)}
+
+    async def learner(engine, session_id, rnd):
+        while (card := await engine.next_card(session_id)) is not None:
+            await engine.submit(session_id, card.answer if rnd.random() < 0.75 else "?")
+            await asyncio.sleep(0)  # Give the other sessions a turn, like a real server would
+        return await engine.finish(session_id)
+
+    async def run():
+        engine = AsyncQuizEngine()
+        engine.register_topic("bench", topic)
+        gc.collect()
+        tracemalloc.start()
+        base = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        ids = [await engine.start("bench") for _ in range(sessions)]
+        per_session = (tracemalloc.get_traced_memory()[0] - base) / sessions
+        tracemalloc.stop()
+        rnd = random.Random(2)
+        await asyncio.gather(*(learner(engine, i, rnd) for i in ids))
+        return sessions / (time.perf_counter() - start), per_session
+
+    return asyncio.run(run())
+
+
+def print_table(title, results):
+    print(f"\n{title}")
+    print(f"{'variant':<28}{'time, s':>10}{'peak, MB':>12}{'retained, MB':>15}")
+    for name, (seconds, peak, retained) in results.items():
+        print(f"{name:<28}{seconds:>10.3f}{peak / 2**20:>12.1f}{retained / 2**20:>15.1f}")
+
+
+def legacy_save_result(filepath, topic, correct, total):
+    """
+    The read-modify-write of the whole saved_result.json file, as
+    QuizApp.save_results did it before the ResultsStore.
+    """
+    if os.path.exists(filepath):
+        with open(filepath, "r", encoding="utf-8") as f:
+            saved_result_json = json.load(f)
+    else:
+        saved_result_json = {}
+    saved_result_json[topic] = {
+        "Дата": datetime.now().strftime("%d.%m.%Y"),
+        "Результат": f"Правильних відповідей {correct}/{total}.",
+    }
+    with open(filepath, "w", encoding="utf-8") as json_file:
+        json.dump(saved_result_json, json_file, ensure_ascii=False, indent=4)
+
+
+def legacy_lookup_result(filepath, topic):
+    """
+    Reading the whole saved_result.json file for one topic, as
+    QuizApp.show_results_chosen_topic did it before the ResultsStore.
+    """
+    with open(filepath, "r", encoding="utf-8") as f:
+        return json.load(f).get(topic)
+
+
+# The stages whose time is mostly waiting for the disk (results_save fsyncs
+# every round, legacy_json_save rewrites a file per round), so it depends on
+# the disk and its cache more than on the code: only their memory is
+# compared with the baseline
+DISK_BOUND_STAGES = {"results_save", "legacy_json_save"}
+
+
+def run_suite(sizes, topics=100, rounds=100, repeat=5):
+    """
+    Time every stage of the pipeline for every size of the vocabulary.
+
+    The results history has size // 10 entries, and "rounds" results are
+    saved and looked up in the results stages. Every stage is timed
+    "repeat" times and the best time is kept. Returns the dictionary
+    "<size>/<stage>" -> {"seconds": ..., "peak_bytes": ...}.
+    """
+    results = {}
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "cards.csv")
+            make_synthetic_csv(path, size, topics)
+            results_dir = os.path.join(tmp, "results")
+            make_results_history(results_dir, max(size // 10, 1), topics)
+            legacy_file = os.path.join(results_dir, "saved_result.json")
+
+            e2u = get_topics_English_to_Ukranian(path)
+            u2e = get_topics_Ukranian_to_English(path)
+            decks = [make_deck(cards) for cards in e2u.values()]
+            answer_sheets = [[card.answer if i % 4 else "?" for i, card in enumerate(deck)] for deck in decks]
+            answers = [answer for sheet in answer_sheets for answer in sheet]
+            topic_names = list(e2u)
+
+            def fresh_decks():
+                for deck in decks:
+                    deck._columns.normalized = None
+
+            def open_store():
+                store = ResultsStore(results_dir, compact_every=10 ** 9)
+                store.compact()  # The snapshot is made once, like after a previous session
+                return store
+
+            store = open_store()
+
+            def save_rounds():
+                for i in range(rounds):
+                    store.append(topic_names[i % len(topic_names)], 15, 20)
+
+            def lookup_rounds():
+                for i in range(rounds):
+                    store.lookup(topic_names[i % len(topic_names)])
+
+            stages = {
+                "get_topics_English_to_Ukranian": (lambda: get_topics_English_to_Ukranian(path), None),
+                "get_topics_Ukranian_to_English": (lambda: get_topics_Ukranian_to_English(path), None),
+                "make_deck": (lambda: [make_deck(cards) for cards in u2e.values()], None),
+                "run_quiz_round": (lambda: [run_quiz_round(d, a) for d, a in zip(decks, answer_sheets)], fresh_decks),
+                "normalize": (lambda: [normalize(answer) for answer in answers], None),
+                "results_open": (lambda: ResultsStore(results_dir), None),
+                "results_save": (save_rounds, None),
+                "results_lookup": (lookup_rounds, None),
+                "legacy_json_save": (lambda: [legacy_save_result(legacy_file, topic_names[i % len(topic_names)], 15, 20) for i in range(rounds)], None),
+                "legacy_json_lookup": (lambda: [legacy_lookup_result(legacy_file, topic_names[i % len(topic_names)]) for i in range(rounds)], None),
+            }
+            # The repeats are whole passes over the stages, not back-to-back
+            # calls, so a slow moment of the machine spoils one time of
+            # several stages rather than every time of one stage
+            for n in range(repeat):
+                for stage, (fn, setup) in stages.items():
+                    key = f"{size}/{stage}"
+                    if n == 0:
+                        seconds, peak, _ = measure(fn, setup)
+                        results[key] = {"seconds": seconds, "peak_bytes": peak}
+                    else:
+                        results[key]["seconds"] = min(results[key]["seconds"], measure(fn, setup, memory=False)[0])
+            for stage in stages:
+                result = results[f"{size}/{stage}"]
+                print(f"{size:>10} {stage:<32}{result['seconds']:>10.4f} s{result['peak_bytes'] / 2**20:>10.1f} MB", flush=True)
+    return results
+
+
+def compare_with_baseline(results, baseline, tolerance, min_seconds=0.005):
+    """
+    Return the list of regressions: the stages which are slower (or use
+    more peak memory) than in the baseline by more than the tolerance.
+    The stages faster than min_seconds are too noisy to compare by time,
+    and the time of DISK_BOUND_STAGES is not compared at all.
+    """
+    regressions = []
+    for key, now in results.items():
+        before = baseline.get(key)
+        if before is None:
+            continue
+        timed = key.split("/", 1)[1] not in DISK_BOUND_STAGES
+        if timed and max(now["seconds"], before["seconds"]) >= min_seconds and now["seconds"] > before["seconds"] * (1 + tolerance):
+            regressions.append(f"{key}: {before['seconds']:.4f} s -> {now['seconds']:.4f} s")
+        if now["peak_bytes"] > before["peak_bytes"] * (1 + tolerance) + 64 * 1024:
+            regressions.append(f"{key}: peak {before['peak_bytes']} -> {now['peak_bytes']} bytes")
+    return regressions
+
+
+def suite_main(args):
+    results = run_suite(args.sizes, args.topics, args.rounds, args.repeat)
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "results": results,
+    }
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"baseline saved to {args.save_baseline}")
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        regressions = compare_with_baseline(results, baseline, args.tolerance)
+        if regressions:
+            print("\nRegressions against the baseline:")
+            print("\n".join(regressions))
+            return 1
+        print("\nNo regressions against the baseline.")
+    return 0
+
+
+def compare_main(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "cards.csv")
+        make_synthetic_csv(path, args.rows, args.topics)
+        print_table(f"Loading {args.rows} rows (both directions)", bench_loaders(path))
+        print_table(f"Topic catalog start, {args.rows} rows", bench_catalog(path))
+        print_table(f"Columnar deck file, {args.rows} rows (both directions)", bench_deck_format(path))
+    print_table(f"Deck of {args.cards * 100} cards + wrong-card replay", bench_decks(args.cards * 100))
+    print_table(f"Grading {args.learners} x {args.cards} answers", bench_grading(args.cards, args.learners, args.workers))
+    rate, per_session = bench_sessions(args.sessions, 20)
+    print(f"\nLoad test: {args.sessions} concurrent sessions of 20 cards")
+    print(f"{rate:.0f} sessions/s, {per_session:.0f} bytes per open session")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="WordCards benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    suite = commands.add_parser("suite", help="time every stage of the pipeline and compare with a baseline")
+    suite.add_argument("--sizes", type=int, nargs="+", default=[1000, 10_000, 100_000],
+                       help="rows of the synthetic vocabularies (up to 10^7)")
+    suite.add_argument("--topics", type=int, default=100, help="number of topics in the synthetic CSV files")
+    suite.add_argument("--rounds", type=int, default=100, help="results saved and looked up in the results stages")
+    suite.add_argument("--json", help="write the results into this JSON file")
+    suite.add_argument("--baseline", help="compare with this baseline JSON file, exit with 1 on regressions")
+    suite.add_argument("--save-baseline", help="save the results as a new baseline JSON file")
+    suite.add_argument("--repeat", type=int, default=5, help="time every stage this many times, keep the best")
+    suite.add_argument("--tolerance", type=float, default=0.5, help="allowed slowdown, 0.5 is +50%%")
+
+    compare = commands.add_parser("compare", help="compare the old and new implementations")
+    compare.add_argument("--rows", type=int, default=100_000, help="number of rows in the synthetic CSV file")
+    compare.add_argument("--topics", type=int, default=100, help="number of topics in the synthetic CSV file")
+    compare.add_argument("--cards", type=int, default=1000, help="cards in the deck for the grading benchmark")
+    compare.add_argument("--learners", type=int, default=200, help="answer sheets for the grading benchmark")
+    compare.add_argument("--sessions", type=int, default=2000, help="concurrent sessions for the load test")
+    compare.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="processes for grade_columns")
+
+    args = parser.parse_args(argv)
+    if args.command == "suite":
+        return suite_main(args)
+    return compare_main(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,102 +1,182 @@
-# Description: This module contains functions for practicing flashcards
-# in both directions: English -> Ukrainian and Ukrainian -> English.
-# The functions track correct answers, incorrect answers, and allow
-# the user to redo mistakes
+# Description: This module contains the console version of the flashcards
+# practice in both directions: English -> Ukrainian and Ukrainian -> English.
+# It tracks correct answers, incorrect answers, and allows the user to
+# redo mistakes.
+# The rounds are run by QuizSession from services_quiz_engine with the same
+# typo-tolerant AnswerIndex the graphical application uses; practice_cards()
+# only asks and prints. The work on mistakes is a loop, not a recursion, and
+# each new round is a view of the wrong cards of the previous one, so a long
+# session does not keep the old rounds in memory.
+#
+# The answers can also come from a file or a pipe (scripted mode) for
+# automated drills and bulk testing: one answer per line, read one line at
+# a time, so the memory does not depend on the length of the script. In this
+# mode the cards are not shuffled: the lines answer the words of the topic
+# in the order of the vocabulary file.
+#
+# Usage:
+#   python cards.py --topic "IT" --direction "English to Ukranian"
+#   python cards.py --topic "IT" --answers answers.txt
+#   generate_answers | python cards.py --topic "IT" --answers -
 
 
-from data_handler import get_topics_English_to_Ukranian, get_topics_Ukranian_to_English
-import random
+import argparse
+import os
+import sys
 
+from answer_matching import EXACT, NEAR, AnswerIndex
+from deck_format import DIRECTIONS, available_directions, topic_words
+from services_quiz_engine import Deck, QuizSession
 
-def practice_cards_English_to_Ukranian(topic):
+
+RETRY_QUESTION = (
+    "\nБажаєте зробити роботу над помилками?\n"
+    "(Введіть 'так' щоб продовжити, або 'ні' щоб повернутися до вибору розділу у головне меню): "
+)
+
+
+def practice_cards(topic, ask=input, say=print, retry=None, shuffle=True):
     """
-    Practice English -> Ukrainian flashcards.
-    
+    Practice the flashcards of one topic in the console.
+
     Parameters:
-        topic (dict): Dictionary of English words as keys and Ukrainian translations as values.
-        
+        topic (dict): Dictionary of the words to translate as keys and their
+            translations as values (either direction).
+        ask (function): Shows the prompt and returns the answer of the user,
+            input() by default; it may raise EOFError when the answers end.
+        say (function): Prints a message, print() by default.
+        retry (bool or None): Whether to do the work on mistakes; None asks the user.
+        shuffle (bool): Randomize the order of the cards (False for the scripts).
+
     Behavior:
         - Randomizes the order of flashcards.
-        - Tracks correct and incorrect answers.
-        - Allows the user to retry incorrect answers.
+        - Tracks correct and incorrect answers, accepting small typos.
+        - Repeats the incorrect answers while the user wants (or retry is True).
+
+    Returns the Result of every round.
     """
-    correct = 0 # Counter for correct answers
-    wrong_answers = {} # Store incorrect answers for review
-
-    # Convert dictionary to list and shuffle to randomize flashcard order
-    items = list(topic.items())
-    random.shuffle(items)
-
-    # Iterate over all flashcards
-    for eng_word, ukr_word in items: 
-        user_input = input(f"{eng_word}: ").strip() # Ask user for translation
-        if user_input.lower() == ukr_word.lower():
-            correct += 1
-        else:
-            wrong_answers[eng_word] = ukr_word # Save wrong answer
+    # Create the shuffled deck; the answers are normalized once for all rounds
+    deck = Deck.from_dict(topic)
+    if shuffle:
+        deck.shuffle()
+    index = AnswerIndex(card.answer for card in deck)
+    results = []
+    while deck:
+        session = QuizSession(deck, index)
+        try:
+            while not session.done:
+                card = session.current()
+                grade = session.submit(ask(f"{card.prompt}: ")) # Ask user for translation
+                if grade == NEAR:
+                    say(f"Майже вірно! Правильна відповідь: {card.answer}")
+                elif grade != EXACT:
+                    say(f"Невірно. Правильна відповідь: {card.answer}")
+        except EOFError:
+            # The answers ended in the middle of the round, the rest is skipped
+            while not session.done:
+                session.skip()
+            results.append(session.finish())
+            say("\nВідповіді закінчилися.")
+            break
+        res = session.finish()
+        results.append(res)
 
-    # Check if all answers were correct        
-    if correct == len(topic):
-        print("\nВітаю! У вас 100% правильних відповідей!")
-        return
-    else:
+        # Check if all answers were correct
+        if res.correct == res.total:
+            say("\nВітаю! У вас 100% правильних відповідей!")
+            break
         # Calculate percentage of correct answers
-        x = (correct * 100) / len(topic)
-        print(f"\nУ вас {x}% правильних відповідей!")
+        x = (res.correct * 100) / res.total
+        say(f"\nУ вас {x}% правильних відповідей!")
 
         # Ask user if they want to review mistakes
-        answer = input(
-            "\nБажаєте зробити роботу над помилками?\n"
-            "(Введіть 'так' щоб продовжити, або 'ні' щоб повернутися до вибору розділу у головне меню): "
-        )
-        if answer.strip().lower() == "так":
-            return practice_cards_English_to_Ukranian(wrong_answers)
+        if retry is None:
+            try:
+                again = ask(RETRY_QUESTION).strip().lower() == "так"
+            except EOFError:
+                again = False
         else:
-            print("Повернення до головного меню...")
+            again = retry
+        if not again:
+            say("Повернення до головного меню...")
+            break
+        deck = res.wrong_cards # Only the wrong cards, a view of the same deck
+    return results
+
+
+def practice_cards_English_to_Ukranian(topic):
+    """
+    Practice English -> Ukrainian flashcards (see practice_cards()).
+    """
+    return practice_cards(topic)
 
 
 def practice_cards_Ukranian_to_English(topic):
     """
-    Practice Ukrainian -> English flashcards.
-    
-    Parameters:
-        topic (dict): Dictionary of Ukrainian words as keys and English translations as values.
-        
-    Behavior:
-        - Randomizes the order of flashcards.
-        - Tracks correct and incorrect answers.
-        - Allows the user to retry incorrect answers.
+    Practice Ukrainian -> English flashcards (see practice_cards()).
     """
-    correct = 0 # Counter for correct answers
-    wrong_answers = {} # Store incorrect answers for review
-
-    # Convert dictionary to list and shuffle to randomize flashcard order
-    items = list(topic.items())
-    random.shuffle(items)
-
-    # Iterate over all flashcards
-    for ukr_word, eng_word in items: 
-        user_input = input(f"{ukr_word}: ").strip() # Ask user for translation
-        if user_input.lower() == eng_word.lower():
-            correct += 1
-        else:
-            wrong_answers[ukr_word] = eng_word # Save wrong answer
+    return practice_cards(topic)
+
+
+def scripted_answers(stream):
+    """
+    Return the ask() function for practice_cards() which takes the answers
+    from the stream line by line and raises EOFError when it ends.
+    """
+    def ask(prompt):
+        line = stream.readline()
+        if not line:
+            raise EOFError
+        return line.rstrip("\r\n")
+    return ask
+
+
+def main(argv=None):
+    """
+    Command line interface of the module.
+    """
+    from data_handler import open_vocabulary
+
+    parser = argparse.ArgumentParser(description="WordCards in the console")
+    parser.add_argument("--data", default=os.environ.get("WORDCARDS_DATA", "data/WordCards.csv"), help="CSV file or vocabulary store")
+    parser.add_argument("--topic", help="the topic to practice (asked if not given)")
+    parser.add_argument("--direction", default=next(iter(DIRECTIONS)), help="for example 'Ukranian to English'")
+    parser.add_argument("--answers", help="read the answers from this file, '-' for stdin (scripted mode)")
+    parser.add_argument("--retry", choices=("ask", "yes", "no"), default=None,
+                        help="the work on mistakes; by default asked, and 'no' in the scripted mode")
+    args = parser.parse_args(argv)
 
-    # Check if all answers were correct
-    if correct == len(topic):
-        print("\nВітаю! У вас 100% правильних відповідей!")
-        return
+    catalog = open_vocabulary(args.data)
+    topic = args.topic
+    if topic is None:
+        names = catalog.names()
+        for i, name in enumerate(names, 1):
+            print(f"{i}. {name}")
+        choice = input("Оберіть тему: ").strip()
+        topic = names[int(choice) - 1] if choice.isdigit() and 0 < int(choice) <= len(names) else choice
+    if topic not in catalog:
+        print(f"Немає теми {topic!r}", file=sys.stderr)
+        return 2
+    if args.direction not in available_directions(catalog):
+        print(f"Немає напрямку {args.direction!r}: {', '.join(available_directions(catalog))}", file=sys.stderr)
+        return 2
+    words = topic_words(catalog, topic, args.direction)
+
+    if args.retry is None:
+        retry = None if args.answers is None else False
     else:
-        # Calculate percentage of correct answers
-        x = (correct * 100) / len(topic)
-        print(f"\nУ вас {x}% правильних відповідей!")
+        retry = {"ask": None, "yes": True, "no": False}[args.retry]
+    if args.answers is None:
+        results = practice_cards(words, retry=retry)
+    elif args.answers == "-":
+        results = practice_cards(words, ask=scripted_answers(sys.stdin), retry=retry, shuffle=False)
+    else:
+        with open(args.answers, encoding="utf-8") as f:
+            results = practice_cards(words, ask=scripted_answers(f), retry=retry, shuffle=False)
+    if results:
+        print(f"{topic}: {results[0].correct}/{results[0].total}") # The result of the first round
+    return 0
 
-        # Ask user if they want to review mistakes
-        answer = input(
-            "\nБажаєте зробити роботу над помилками?\n"
-            "(Введіть 'так' щоб продовжити, або 'ні' щоб повернутися до вибору розділу у головне меню): "
-        )
-        if answer.strip().lower() == "так":
-            return practice_cards_Ukranian_to_English(wrong_answers)
-        else:
-            print("Повернення до головного меню...")
\ No newline at end of file
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,47 @@
 # Description: This module contains functions for convering CSV file
 # into dictionaries in both directions: English -> Ukrainian and Ukrainian -> English.
+# The TopicCatalog class is what the application reads a CSV file with: it
+# only remembers where the rows of each topic are in the file (saved in a
+# small sidecar index next to the CSV file, so the next launch does not
+# parse the file again) and reads the words of a topic when they are needed.
+# The sidecar index is the compiled cache of the file: a marshal blob checked
+# by the modification time, size and hash of the CSV file and rebuilt when
+# they change. It replaced the older cache of all the words, which had to be
+# loaded whole and kept every topic in memory.
+# The words of a read topic are kept in a DeckIndex: every word is stored
+# once in a shared table, and both directions are views of the same data.
+# The get_topics_* functions are the old eager loaders of the whole file,
+# kept for the scripts which use them.
+# The iter_row_batches() generator streams big CSV files in batches of rows
+# with progress reporting and without stopping on malformed rows, and
+# write_topics_incrementally() uses it to split a huge file into one CSV
+# file per topic with bounded memory.
+# The get_topics_* functions and open_vocabulary() also accept the path of
+# an SQLite vocabulary store (see vocab_store), and open_vocabulary() also
+# opens the multi-language deck files (see deck_format).
+# The loaders report their timings and the bytes read and written to the
+# metrics module when the instrumentation is on.
+#
+# Usage (prebuild the sidecar topic index):
+#   python data_handler.py build-catalog data/WordCards.csv
 
 
 import csv 
+import hashlib
+import marshal
+import os
+import re
+import sys
+import time
+from array import array
+from collections import OrderedDict
+from collections.abc import Mapping
+
+import metrics
 
 
 #English to Ukranian
+@metrics.timed("get_topics_english_to_ukranian")
 def get_topics_English_to_Ukranian(file):
     """
     The function gives a data for te cards of word to practice vocabulay
@@ -20,7 +56,15 @@ def get_topics_English_to_Ukranian(file):
     whitespaces from topics names, English and Ukranian words and ignoring
     the topics where is no words to practice yet.
     """
+    store = _open_store(file)
+    if store is not None: # The vocabulary store gives the same dictionaries
+        try:
+            return {topic: store.english_to_ukranian(topic) for topic in store.names()}
+        finally:
+            store.close()
+
     topics = {}     # Create empty dictionary to store topics
+    metrics.inc("bytes_read_total", os.path.getsize(file), {"source": "csv"})
 
     # Open the CSV file with UTF-8 encoding
     with open(file, encoding="utf-8") as f:   
@@ -40,6 +84,7 @@ def get_topics_English_to_Ukranian(file):
     return topics
 
 
+@metrics.timed("get_topics_ukranian_to_english")
 def get_topics_Ukranian_to_English(file):
     """
     The function gives a data for te cards of word to practice vocabulay
@@ -53,7 +98,15 @@ def get_topics_Ukranian_to_English(file):
     are the Ukranian words and the values are their translation on English.
     
     """
+    store = _open_store(file)
+    if store is not None: # The vocabulary store gives the same dictionaries
+        try:
+            return {topic: store.ukranian_to_english(topic) for topic in store.names()}
+        finally:
+            store.close()
+
     topics = {} # Create empty dictionary to store topics
+    metrics.inc("bytes_read_total", os.path.getsize(file), {"source": "csv"})
 
     # Open the CSV file with UTF-8 encoding
     with open(file, encoding="utf-8") as f:   
@@ -70,4 +123,619 @@ def get_topics_Ukranian_to_English(file):
                     topics[topic] = {} # Initialize nested dictionary for word -> translation
                 topics[topic][ukr_word] = eng_word # Add the Ukrainian -> English pair 
 
-    return topics
\ No newline at end of file
+    return topics
+
+
+class DeckIndex:
+    """
+    The class keeps the words of the CSV file (the TopicCatalog keeps one
+    per read topic) in a compact form.
+
+    Every distinct string (topic name, English or Ukranian word) is stored
+    only once in the "strings" table, and the rows are kept as three
+    array-backed columns of ids into that table. The rows of each topic
+    are remembered as an array of row numbers.
+
+    The direction views (english_to_ukranian() and ukranian_to_english())
+    do not copy any strings, they only read the shared columns.
+    """
+
+    def __init__(self):
+        self.strings = []               # Interned string table
+        self.string_ids = {}            # String -> its id in the table
+        self.topic_col = array("I")     # Topic id of each row
+        self.eng_col = array("I")       # English word id of each row
+        self.ukr_col = array("I")       # Ukranian word id of each row
+        self.topic_rows = {}            # Topic name -> array of row numbers
+
+    def intern(self, s):
+        """
+        Return the id of the string in the table, adding it if it is new.
+        """
+        sid = self.string_ids.get(s)
+        if sid is None:
+            sid = len(self.strings)
+            self.strings.append(s)
+            self.string_ids[s] = sid
+        return sid
+
+    def add(self, eng_word, ukr_word, topic):
+        """
+        Add one row (already stripped) to the index.
+        """
+        rows = self.topic_rows.get(topic)
+        if rows is None:
+            rows = self.topic_rows[topic] = array("I")
+        rows.append(len(self.topic_col))
+        self.topic_col.append(self.intern(topic))
+        self.eng_col.append(self.intern(eng_word))
+        self.ukr_col.append(self.intern(ukr_word))
+
+    def __len__(self):
+        return len(self.topic_col)
+
+    def english_to_ukranian(self):
+        """
+        Return the view with the same shape as get_topics_English_to_Ukranian().
+        """
+        return DirectionView(self, self.eng_col, self.ukr_col)
+
+    def ukranian_to_english(self):
+        """
+        Return the view with the same shape as get_topics_Ukranian_to_English().
+        """
+        return DirectionView(self, self.ukr_col, self.eng_col)
+
+
+class DirectionView(Mapping):
+    """
+    Read-only mapping topic -> TopicView for one translation direction.
+    """
+
+    def __init__(self, index, key_col, value_col):
+        self._index = index
+        self._key_col = key_col
+        self._value_col = value_col
+        self._topics = {}   # Already created TopicViews
+
+    def __getitem__(self, topic):
+        view = self._topics.get(topic)
+        if view is None:
+            rows = self._index.topic_rows[topic]  # KeyError for unknown topics
+            view = self._topics[topic] = TopicView(self._index, rows, self._key_col, self._value_col)
+        return view
+
+    def __iter__(self):
+        return iter(self._index.topic_rows)
+
+    def __len__(self):
+        return len(self._index.topic_rows)
+
+
+class TopicView(Mapping):
+    """
+    Read-only mapping word -> translation for one topic and one direction.
+
+    Like the old dictionaries, if the same word appears several times in
+    a topic, the last translation wins. The lookup table is built from
+    the integer ids only on the first use of the view.
+    """
+
+    def __init__(self, index, rows, key_col, value_col):
+        self._index = index
+        self._rows = rows
+        self._key_col = key_col
+        self._value_col = value_col
+        self._lookup = None     # Word id -> translation id, built lazily
+
+    def _ids(self):
+        if self._lookup is None:
+            key_col, value_col = self._key_col, self._value_col
+            self._lookup = {key_col[r]: value_col[r] for r in self._rows}
+        return self._lookup
+
+    def __getitem__(self, word):
+        sid = self._index.string_ids.get(word)
+        lookup = self._ids()
+        if sid is None or sid not in lookup:
+            raise KeyError(word)
+        return self._index.strings[lookup[sid]]
+
+    def __iter__(self):
+        strings = self._index.strings
+        return (strings[k] for k in self._ids())
+
+    def __len__(self):
+        return len(self._ids())
+
+    def items(self):
+        strings = self._index.strings
+        return [(strings[k], strings[v]) for k, v in self._ids().items()]
+
+
+CATALOG_SUFFIX = ".topics"  # The sidecar topic index of "cards.csv" is "cards.csv.topics"
+CACHE_VERSION = 1           # Change it when the layout of the cache changes
+
+
+def file_digest(file):
+    """
+    Return the BLAKE2 hash of the content of the file as a hex string.
+    """
+    h = hashlib.blake2b(digest_size=20)
+    with open(file, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _cache_header(file, digest=None):
+    """
+    Build the header which describes the CSV file the cache was made from.
+    """
+    st = os.stat(file)
+    return {
+        "version": CACHE_VERSION,
+        "byteorder": sys.byteorder,
+        "itemsize": array("I").itemsize,
+        "mtime_ns": st.st_mtime_ns,
+        "size": st.st_size,
+        "digest": digest if digest is not None else file_digest(file),
+    }
+
+
+def _write_cache(file, cache_file, payload, digest=None):
+    """
+    Write the payload into the binary cache file of the CSV file.
+
+    The file is written with marshal in two parts: the small header first
+    (so it can be checked without reading everything) and then the payload.
+    The cache is written into a temporary file and then renamed, so
+    a half-written cache is never left on the disk.
+    """
+    header = _cache_header(file, digest)
+    tmp = cache_file + ".tmp"
+    with open(tmp, "wb") as f:
+        marshal.dump(header, f)
+        marshal.dump(payload, f)
+        metrics.inc("bytes_written_total", f.tell(), {"source": "cache"})
+    os.replace(tmp, cache_file)
+
+
+def _read_cache_header(cache_file):
+    """
+    Return the header of the cache file or None if it can not be read.
+    """
+    try:
+        with open(cache_file, "rb") as f:
+            header = marshal.load(f)
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    if not isinstance(header, dict) or header.get("version") != CACHE_VERSION:
+        return None
+    if header.get("byteorder") != sys.byteorder or header.get("itemsize") != array("I").itemsize:
+        return None
+    return header
+
+
+def _read_cache_payload(cache_file):
+    """
+    Return the payload of the cache file or None if it is broken.
+    """
+    try:
+        with open(cache_file, "rb") as f:
+            marshal.load(f)  # Skip the header
+            # marshal.loads() on the whole blob is much faster than marshal.load()
+            # on the file object, which reads it in many small pieces
+            blob = f.read()
+            metrics.inc("bytes_read_total", len(blob), {"source": "cache"})
+            return marshal.loads(blob)
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+
+
+def _read_cache(file, cache_file):
+    """
+    Return (payload, digest) of the cache file of the CSV file.
+
+    The cache is used without any checks of the content if the modification
+    time and size of the CSV file are the same as when the cache was built.
+    If only the time differs, the hash of the CSV file is compared: when the
+    content is the same (for example, the file was only touched or copied)
+    the cache is still used and its header is refreshed.
+
+    The payload is None when the cache is missing or stale. The digest is
+    the hash of the CSV file if it was computed, so it is not computed twice.
+    """
+    header = _read_cache_header(cache_file)
+    if header is None:
+        return None, None
+    st = os.stat(file)
+    if header["size"] != st.st_size:
+        return None, None
+    if header["mtime_ns"] == st.st_mtime_ns:
+        return _read_cache_payload(cache_file), None
+
+    digest = file_digest(file)
+    if digest != header["digest"]:
+        return None, digest
+    payload = _read_cache_payload(cache_file)
+    if payload is not None:
+        try:
+            _write_cache(file, cache_file, payload, digest)
+        except OSError:
+            pass
+    return payload, digest
+
+
+_UNDECODED = re.compile("[\udc80-\udcff]")  # Bytes which were not valid UTF-8
+
+
+def iter_csv_records(f, on_error=None):
+    """
+    The generator reads the CSV file opened in binary mode and yields
+    pairs (offset, row), where offset is the position of the first byte
+    of the row in the file and row is the list of fields.
+
+    The lines are given to csv.reader one by one, so the records with
+    line breaks inside quoted fields are supported too.
+
+    Without on_error the broken records raise an exception as usual.
+    With on_error(offset, message) they are reported and skipped: the
+    records with invalid UTF-8 and the records csv.reader can not parse.
+    """
+    pos = f.tell()
+    end = [pos]
+    errors = "strict" if on_error is None else "surrogateescape"
+
+    def lines():
+        for raw in f:
+            end[0] += len(raw)
+            yield raw.decode("utf-8", errors)
+
+    reader = csv.reader(lines())
+    while True:
+        try:
+            row = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as e:
+            if on_error is None:
+                raise
+            on_error(pos, str(e))
+            pos = end[0]
+            continue
+        if on_error is not None and any(_UNDECODED.search(field) for field in row):
+            on_error(pos, "invalid UTF-8")
+        else:
+            yield pos, row
+        pos = end[0]
+
+
+def _header_positions(header):
+    """
+    Return the positions of the "eng_word", "ukr_word" and "topic" columns.
+    """
+    header = [h.strip() for h in header]
+    return header.index("eng_word"), header.index("ukr_word"), header.index("topic")
+
+
+class TopicCatalog:
+    """
+    The lazy catalog of topics of the CSV file.
+
+    The first pass over the file remembers only the names of the topics and
+    the byte offsets of their rows (the offsets are also saved into a small
+    sidecar file "<file>.topics", so the next launch does not even need the
+    first pass). The words of a topic are read from the file only when the
+    topic is asked for, and the last "cache_size" read topics are kept in
+    a LRU cache. So the memory depends on the topics actually practiced,
+    not on the size of the file.
+    """
+
+    def __init__(self, file, cache_size=16):
+        self.file = file
+        self.cache_size = cache_size
+        self.columns = None     # Positions of the eng_word, ukr_word and topic columns
+        self.offsets = {}       # Topic name -> array of byte offsets of its rows
+        self._cache = OrderedDict()  # Topic name -> (E2U view, U2E view, distractor indexes)
+
+    @classmethod
+    def open(cls, file, cache_size=16, catalog_file=None, on_progress=None, on_error=None):
+        """
+        Return the catalog of the file, reading the sidecar index when it is
+        valid and scanning the file (and saving the index) when it is not.
+        on_progress and on_error are given to scan().
+        """
+        catalog = cls(file, cache_size)
+        catalog_file = catalog_file or file + CATALOG_SUFFIX
+        payload, digest = _read_cache(file, catalog_file)
+        if payload is not None:
+            columns, offsets = payload
+            catalog.columns = tuple(columns)
+            catalog.offsets = {topic: array("Q", rows) for topic, rows in offsets}
+            return catalog
+
+        catalog.scan(on_progress, on_error)
+        try:
+            catalog.save(catalog_file, digest)
+        except OSError:
+            pass
+        return catalog
+
+    def save(self, catalog_file=None, digest=None):
+        """
+        Save the offsets into the sidecar index file.
+        """
+        payload = (self.columns, [(topic, rows.tobytes()) for topic, rows in self.offsets.items()])
+        _write_cache(self.file, catalog_file or self.file + CATALOG_SUFFIX, payload, digest)
+
+    @metrics.timed("catalog_scan")
+    def scan(self, on_progress=None, on_error=None):
+        """
+        Read the file once and remember the offsets of the rows of each topic.
+        The words themselves are not kept. The parameters are the same as
+        for iter_row_batches().
+        """
+        offsets = {}
+        batches = iter_row_batches(self.file, on_progress=on_progress, on_error=on_error)
+        self.columns = next(batches, None)
+        for batch in batches:
+            for _, _, topic, offset in batch:
+                rows = offsets.get(topic)
+                if rows is None:
+                    rows = offsets[topic] = array("Q")
+                rows.append(offset)
+        self.offsets = offsets
+        self._cache.clear()
+        metrics.inc("bytes_read_total", os.path.getsize(self.file), {"source": "csv"})
+
+    def names(self):
+        """
+        Return the sorted list of topic names.
+        """
+        return sorted(self.offsets)
+
+    def __contains__(self, topic):
+        return topic in self.offsets
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def _load(self, topic):
+        """
+        Return (E2U view, U2E view, distractor indexes) of the topic, reading
+        it from the file if it is not in the LRU cache. Both views read the
+        same DeckIndex of the topic, so every word is kept only once.
+        """
+        entry = self._cache.get(topic)
+        if entry is not None:
+            self._cache.move_to_end(topic)
+            metrics.inc("catalog_cache_hits_total")
+            return entry
+
+        start = time.perf_counter()
+        eng_pos, ukr_pos, topic_pos = self.columns
+        index = DeckIndex()
+        read = 0
+        with open(self.file, "rb") as f:
+            for offset in self.offsets[topic]:  # KeyError for unknown topics
+                f.seek(offset)
+                _, row = next(iter_csv_records(f))
+                read += f.tell() - offset
+                index.add(row[eng_pos].strip(), row[ukr_pos].strip(), topic)
+        metrics.inc("catalog_cache_misses_total")
+        metrics.inc("bytes_read_total", read, {"source": "catalog"})
+        metrics.observe("catalog_load_topic_seconds", time.perf_counter() - start)
+
+        # The third item keeps the DistractorIndex of each direction
+        entry = self._cache[topic] = (index.english_to_ukranian()[topic], index.ukranian_to_english()[topic], {})
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return entry
+
+    def english_to_ukranian(self, topic):
+        """
+        Return the mapping English word -> Ukranian word of the topic.
+        """
+        return self._load(topic)[0]
+
+    def ukranian_to_english(self, topic):
+        """
+        Return the mapping Ukranian word -> English word of the topic.
+        """
+        return self._load(topic)[1]
+
+    def distractor_index(self, topic, direction):
+        """
+        Return the DistractorIndex of the answers of the topic in the
+        direction name (see deck_format.DIRECTIONS) for the multiple-choice
+        mode. It is built once and kept in the LRU cache with the words.
+        """
+        from deck_format import topic_words
+        from distractors import DistractorIndex
+
+        indexes = self._load(topic)[2]
+        index = indexes.get(direction)
+        if index is None:
+            index = indexes[direction] = DistractorIndex(topic_words(self, topic, direction).values())
+        return index
+
+
+def iter_row_batches(file, batch_size=10000, on_progress=None, on_error=None):
+    """
+    The generator streams the CSV file in batches, so even the files of
+    several gigabytes are read with a small and constant amount of memory.
+
+    The first value it yields is the tuple with the positions of the
+    "eng_word", "ukr_word" and "topic" columns. Then it yields lists of
+    at most batch_size tuples (eng_word, ukr_word, topic, offset), where
+    offset is the position of the row in the file. The rows are cleaned
+    the same way as in get_topics_* functions.
+
+    on_progress(bytes_read, total_bytes) is called after every batch.
+    on_error(offset, message) is called for every malformed row (too few
+    fields, invalid UTF-8, broken quotes); such rows are skipped and the
+    reading goes on. Without on_error the malformed rows are skipped silently.
+    """
+    total = os.path.getsize(file)
+    report = on_error or (lambda offset, message: None)
+    with open(file, "rb") as f:
+        records = iter_csv_records(f, on_error=report)
+        header = next(records, None)
+        if header is None:
+            return
+        columns = _header_positions(header[1])
+        eng_pos, ukr_pos, topic_pos = columns
+        width = max(columns) + 1
+        yield columns
+
+        batch = []
+        for offset, row in records:
+            if len(row) < width:
+                if row:  # Empty lines are not errors
+                    report(offset, f"expected {width} fields, got {len(row)}")
+                continue
+            topic = row[topic_pos].strip()
+            eng_word = row[eng_pos].strip()
+            ukr_word = row[ukr_pos].strip()
+            if topic and eng_word and ukr_word:
+                batch.append((eng_word, ukr_word, topic, offset))
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+                    if on_progress:
+                        on_progress(f.tell(), total)
+        if batch:
+            yield batch
+        if on_progress:
+            on_progress(total, total)
+
+
+def _topic_file_name(topic):
+    """
+    Return the safe file name for the topic.
+    """
+    name = re.sub(r"[^\w\- ]", "_", topic).strip() or "_"
+    return name + ".csv"
+
+
+def write_topics_incrementally(file, out_dir, batch_size=10000, max_open_files=64,
+                               on_progress=None, on_error=None):
+    """
+    Split the CSV file into one CSV file per topic in the out_dir folder.
+
+    The rows are written as soon as their batch is read, so the memory
+    does not depend on the size of the file: only one batch and at most
+    max_open_files open files are kept at the same time. The files of
+    different topics with the same safe name are written into one file,
+    the topic column keeps the real topic name.
+
+    Returns the dictionary with the number of "rows", "topics" and
+    "malformed" rows.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    stats = {"rows": 0, "topics": 0, "malformed": 0}
+    created = set()             # Files created by this import
+    handles = OrderedDict()     # File name -> (file, csv writer), the LRU of open files
+
+    def count_error(offset, message):
+        stats["malformed"] += 1
+        if on_error:
+            on_error(offset, message)
+
+    def writer_for(topic):
+        name = _topic_file_name(topic)
+        handle = handles.get(name)
+        if handle is not None:
+            handles.move_to_end(name)
+            return handle[1]
+        if len(handles) >= max_open_files:
+            handles.popitem(last=False)[1][0].close()
+        path = os.path.join(out_dir, name)
+        new = name not in created
+        out = open(path, "w" if new else "a", encoding="utf-8", newline="")
+        writer = csv.writer(out)
+        if new:
+            created.add(name)
+            writer.writerow(["eng_word", "ukr_word", "topic"])
+        handles[name] = (out, writer)
+        return writer
+
+    topics = set()
+    try:
+        batches = iter_row_batches(file, batch_size, on_progress, count_error)
+        next(batches, None)  # The column positions are not needed
+        for batch in batches:
+            for eng_word, ukr_word, topic, _ in batch:
+                writer_for(topic).writerow([eng_word, ukr_word, topic])
+                topics.add(topic)
+            stats["rows"] += len(batch)
+    finally:
+        for out, _ in handles.values():
+            out.close()
+    stats["topics"] = len(topics)
+    return stats
+
+
+def _open_store(file):
+    """
+    Return the VocabStore if the file is a vocabulary store, otherwise None.
+    """
+    from vocab_store import VocabStore, is_vocab_store  # vocab_store imports this module
+
+    return VocabStore(file) if is_vocab_store(file) else None
+
+
+def open_vocabulary(file, cache_size=16, on_progress=None):
+    """
+    Return the object the application reads the topics from: the
+    VocabStore for a vocabulary store file, the DeckFile for a .wcd deck
+    file, the TopicCatalog for a CSV file. All of them have names(),
+    english_to_ukranian(topic) and ukranian_to_english(topic); use
+    deck_format.topic_words() for any direction.
+    """
+    from deck_format import DECK_SUFFIX, DeckFile
+
+    if file.endswith(DECK_SUFFIX):
+        return DeckFile.open(file)
+    store = _open_store(file)
+    if store is not None:
+        return store
+    return TopicCatalog.open(file, cache_size, on_progress=on_progress)
+
+
+def main(argv=None):
+    """
+    Command line interface of the module.
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(description="WordCards data tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_catalog = commands.add_parser("build-catalog", help="prebuild the sidecar topic index of a CSV file")
+    build_catalog.add_argument("files", nargs="+", help="CSV files with cards")
+    split = commands.add_parser("split-topics", help="split a big CSV file into one CSV file per topic")
+    split.add_argument("file", help="CSV file with cards")
+    split.add_argument("out_dir", help="folder for the topic files")
+    split.add_argument("--batch-size", type=int, default=10000, help="rows read at once")
+    args = parser.parse_args(argv)
+
+    if args.command == "build-catalog":
+        for file in args.files:
+            catalog = TopicCatalog(file)
+            catalog.scan()
+            catalog.save()
+            print(f"{file}: {len(catalog)} topics -> {file + CATALOG_SUFFIX}")
+    elif args.command == "split-topics":
+        def progress(done, total):
+            print(f"\r{100 * done // max(total, 1)}%", end="", flush=True)
+
+        def error(offset, message):
+            print(f"\nbyte {offset}: {message}", file=sys.stderr)
+
+        stats = write_topics_incrementally(args.file, args.out_dir, args.batch_size, on_progress=progress, on_error=error)
+        print(f"\n{stats['rows']} rows, {stats['topics']} topics, {stats['malformed']} malformed rows")
+
+
+if __name__ == "__main__":
+    main()
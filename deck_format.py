@@ -0,0 +1,363 @@
+# Description: This module contains the general deck format of WordCards:
+# any number of languages, several accepted answers in one cell and topics
+# organized in a hierarchy, stored in a compact columnar binary file (.wcd).
+#
+# The rows are sorted by topic (keeping their order inside a topic), so the
+# topics are dictionary-encoded as a list of names and an array of the row
+# where each topic starts. Every language column is one UTF-8 blob of the
+# cells separated by "\0"; a column is decoded only when a direction needs
+# it, and then all its topics are served without reading the file again.
+# One load serves every direction pair, for example en -> uk, uk -> en, de -> uk.
+#
+# A cell may contain several answers separated by "|" (the first one is
+# shown as the prompt, all of them are accepted, see answer_matching).
+# A topic name may contain "/" for the hierarchy: "Business/Finance" is a
+# subtopic of "Business", and practicing "Business" takes the words of all
+# its subtopics.
+#
+# The DIRECTIONS mapping gives the languages of the direction names shown
+# to the user ("English to Ukranian" -> ("en", "uk")), and topic_words()
+# returns the words of a topic in a direction from any vocabulary the
+# application can open (this deck, the TopicCatalog or the VocabStore).
+#
+# Usage:
+#   python deck_format.py import data/WordCards.csv data/WordCards.wcd
+#   python deck_format.py info data/WordCards.wcd
+#   python deck_format.py bench data/WordCards.csv
+
+
+import csv
+import marshal
+import os
+import sys
+import time
+from array import array
+from itertools import permutations
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+
+DECK_SUFFIX = ".wcd"
+DECK_FORMAT = "wordcards-deck"
+DECK_VERSION = 1
+
+TOPIC_SEPARATOR = "/"   # "Business/Finance" is a subtopic of "Business"
+ANSWER_SEPARATOR = "|"  # "макет|план" accepts both answers
+
+# The names of the languages in the direction names
+LANGUAGE_NAMES = {"en": "English", "uk": "Ukranian", "de": "German", "fr": "French", "es": "Spanish", "pl": "Polish"}
+# The CSV columns of the old format and their languages
+LEGACY_COLUMNS = {"eng_word": "en", "ukr_word": "uk"}
+
+
+def direction_name(source: str, target: str) -> str:
+    """
+    Return the name of the direction shown to the user, e.g. "English to Ukranian".
+    """
+    return f"{LANGUAGE_NAMES.get(source, source)} to {LANGUAGE_NAMES.get(target, target)}"
+
+
+# Direction name -> (source language, target language)
+DIRECTIONS: Dict[str, Tuple[str, str]] = {
+    direction_name("en", "uk"): ("en", "uk"),
+    direction_name("uk", "en"): ("uk", "en"),
+}
+
+
+def direction_languages(direction: str) -> Tuple[str, str]:
+    """
+    Return (source, target) languages of the direction name.
+    """
+    pair = DIRECTIONS.get(direction)
+    if pair is not None:
+        return pair
+    codes = {name: code for code, name in LANGUAGE_NAMES.items()}
+    source, sep, target = direction.partition(" to ")
+    if not sep:
+        raise KeyError(direction)
+    return codes.get(source, source), codes.get(target, target)
+
+
+def first_answer(cell: str) -> str:
+    """
+    Return the first of the answers of the cell (it is shown as the prompt).
+    """
+    return cell.split(ANSWER_SEPARATOR, 1)[0].strip()
+
+
+def topic_ancestors(topic: str) -> List[str]:
+    """
+    Return the parents of the topic: "A/B/C" gives ["A", "A/B"].
+    """
+    parts = topic.split(TOPIC_SEPARATOR)
+    return [TOPIC_SEPARATOR.join(parts[:i]) for i in range(1, len(parts))]
+
+
+class DeckFile:
+    """
+    The vocabulary of a .wcd file: the languages, the topics and the columns.
+
+    It has the same reading interface as TopicCatalog and VocabStore
+    (names(), "topic in deck", english_to_ukranian(topic) and
+    ukranian_to_english(topic)) plus words(topic, source, target) for any
+    pair of its languages.
+    """
+
+    def __init__(self, languages: Sequence[str], topics: Sequence[str], starts: array, blobs: Dict[str, bytes]):
+        self.languages = list(languages)
+        self.topics = list(topics)      # The leaf topics in the order of the rows
+        self.starts = starts            # Row where each topic starts, plus the number of rows
+        self._blobs = dict(blobs)       # Language -> encoded column, until it is decoded
+        self._columns: Dict[str, List[str]] = {}
+        self._distractors: Dict[Tuple[str, str], object] = {}  # (topic, direction) -> DistractorIndex
+        self._ranges: Dict[str, List[Tuple[int, int]]] = {}
+        for i, topic in enumerate(self.topics):
+            span = (starts[i], starts[i + 1])
+            for name in topic_ancestors(topic) + [topic]:
+                self._ranges.setdefault(name, []).append(span)
+
+    @classmethod
+    def open(cls, path: str) -> "DeckFile":
+        """
+        Read the .wcd file. Raises ValueError if it is not a deck file of this version.
+        """
+        with open(path, "rb") as f:
+            data = f.read()
+        try:
+            header, topics, starts, blobs = marshal.loads(data)
+        except (EOFError, ValueError, TypeError):
+            raise ValueError(f"{path} is not a WordCards deck file")
+        if not isinstance(header, dict) or header.get("format") != DECK_FORMAT or header.get("version") != DECK_VERSION:
+            raise ValueError(f"{path} is not a WordCards deck file of version {DECK_VERSION}")
+        starts_array = array("I")
+        starts_array.frombytes(starts)
+        if header.get("byteorder") != sys.byteorder:
+            starts_array.byteswap()
+        return cls(header["languages"], topics, starts_array, dict(zip(header["languages"], blobs)))
+
+    def save(self, path: str) -> None:
+        """
+        Write the deck into the .wcd file (a temporary file renamed at the end).
+        """
+        header = {"format": DECK_FORMAT, "version": DECK_VERSION, "languages": self.languages,
+                  "byteorder": sys.byteorder, "rows": len(self)}
+        blobs = [self._blobs[lang] if lang in self._blobs else _encode_column(self._columns[lang]) for lang in self.languages]
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            marshal.dump((header, self.topics, self.starts.tobytes(), blobs), f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def from_rows(cls, languages: Sequence[str], rows: Iterable[Tuple[str, Sequence[str]]]) -> "DeckFile":
+        """
+        Create the deck from the rows (topic, cells in the order of the languages).
+        The rows are grouped by topic, keeping the order of the first appearance.
+        """
+        grouped: Dict[str, List[Sequence[str]]] = {}
+        for topic, cells in rows:
+            grouped.setdefault(topic, []).append(cells)
+        starts = array("I", [0])
+        columns: Dict[str, List[str]] = {lang: [] for lang in languages}
+        for topic, topic_rows in grouped.items():
+            for cells in topic_rows:
+                for lang, cell in zip(languages, cells):
+                    columns[lang].append(cell)
+            starts.append(starts[-1] + len(topic_rows))
+        deck = cls(languages, list(grouped), starts, {})
+        deck._columns = columns
+        return deck
+
+    def __len__(self) -> int:
+        return self.starts[-1] if self.starts else 0
+
+    def column(self, language: str) -> List[str]:
+        """
+        Return the cells of the language in the order of the rows (decoded once).
+        """
+        cells = self._columns.get(language)
+        if cells is None:
+            blob = self._blobs.pop(language)  # KeyError for an unknown language
+            # A column of one empty cell is an empty blob too, so the number
+            # of rows tells an empty deck from it
+            cells = self._columns[language] = blob.decode("utf-8").split("\0") if len(self) else []
+        return cells
+
+    def names(self) -> List[str]:
+        """
+        Return the topics, every parent topic right before its first subtopic.
+        """
+        return list(self._ranges)
+
+    def __contains__(self, topic) -> bool:
+        return topic in self._ranges
+
+    def directions(self) -> List[str]:
+        """
+        Return the names of all the directions between the languages of the deck.
+        """
+        return [direction_name(a, b) for a, b in permutations(self.languages, 2)]
+
+    def words(self, topic: str, source: str, target: str) -> Dict[str, str]:
+        """
+        Return the dictionary prompt -> answers of the topic (with its
+        subtopics) from the source language to the target language.
+        The rows where either cell is empty are skipped.
+        """
+        prompts, answers = self.column(source), self.column(target)
+        words = {}
+        for start, end in self._ranges[topic]:  # KeyError for unknown topics
+            for i in range(start, end):
+                prompt, answer = first_answer(prompts[i]), answers[i].strip()
+                if prompt and answer:
+                    words[prompt] = answer
+        return words
+
+    def english_to_ukranian(self, topic: str) -> Dict[str, str]:
+        return self.words(topic, "en", "uk")
+
+    def ukranian_to_english(self, topic: str) -> Dict[str, str]:
+        return self.words(topic, "uk", "en")
+
+    def distractor_index(self, topic: str, direction: str):
+        """
+        Return the DistractorIndex of the topic in the direction name for
+        the multiple-choice mode (built once and kept with the deck).
+        """
+        from distractors import DistractorIndex
+
+        index = self._distractors.get((topic, direction))
+        if index is None:
+            source, target = direction_languages(direction)
+            index = self._distractors[(topic, direction)] = DistractorIndex(self.words(topic, source, target).values())
+        return index
+
+
+def _encode_column(cells: Sequence[str]) -> bytes:
+    if any("\0" in cell for cell in cells):
+        raise ValueError("a cell contains the NUL character")
+    return "\0".join(cells).encode("utf-8")
+
+
+def topic_words(vocabulary, topic: str, direction: str) -> Dict[str, str]:
+    """
+    Return the words of the topic in the direction from the vocabulary
+    opened by data_handler.open_vocabulary().
+    """
+    source, target = direction_languages(direction)
+    if hasattr(vocabulary, "words"):
+        return vocabulary.words(topic, source, target)
+    if (source, target) == ("en", "uk"):
+        return vocabulary.english_to_ukranian(topic)
+    if (source, target) == ("uk", "en"):
+        return vocabulary.ukranian_to_english(topic)
+    raise KeyError(direction)
+
+
+def available_directions(vocabulary) -> List[str]:
+    """
+    Return the direction names the vocabulary can serve.
+    """
+    if hasattr(vocabulary, "directions"):
+        return vocabulary.directions()
+    return list(DIRECTIONS)
+
+
+def import_csv(csv_file: str, deck_file: Optional[str] = None, topic_column: str = "topic") -> DeckFile:
+    """
+    Convert the CSV file into the deck file and return the deck.
+
+    Every column except the topic is a language: its name is the language
+    code ("en", "uk", "de", ...), and the columns of the old format
+    "eng_word" and "ukr_word" become "en" and "uk". The rows with an empty
+    topic or with no words are skipped, like in data_handler.
+    """
+    with open(csv_file, encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        header = [name.strip() for name in next(reader, [])]
+        if topic_column not in header:
+            raise ValueError(f"{csv_file} has no '{topic_column}' column")
+        topic_pos = header.index(topic_column)
+        positions = [i for i in range(len(header)) if i != topic_pos]
+        languages = [LEGACY_COLUMNS.get(header[i], header[i]) for i in positions]
+
+        def rows():
+            for row in reader:
+                if len(row) < len(header):
+                    continue
+                topic = row[topic_pos].strip()
+                cells = [row[i].strip() for i in positions]
+                if topic and sum(1 for cell in cells if cell) >= 2:
+                    yield topic, cells
+
+        deck = DeckFile.from_rows(languages, rows())
+    if deck_file:
+        deck.save(deck_file)
+    return deck
+
+
+def bench(csv_file: str, repeat: int = 5) -> None:
+    """
+    Compare the load time and the size of the CSV file and its deck file.
+    """
+    from data_handler import get_topics_English_to_Ukranian, get_topics_Ukranian_to_English
+
+    deck_file = csv_file + DECK_SUFFIX
+    import_csv(csv_file, deck_file)
+
+    def best(fn):
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - start)
+        return min(times)
+
+    def load_deck():
+        deck = DeckFile.open(deck_file)
+        for topic in deck.topics:
+            deck.english_to_ukranian(topic)
+            deck.ukranian_to_english(topic)
+
+    def load_csv():
+        get_topics_English_to_Ukranian(csv_file)
+        get_topics_Ukranian_to_English(csv_file)
+
+    print(f"{'':<36}{'size, bytes':>14}{'load, s':>10}")
+    print(f"{'CSV, both directions':<36}{os.path.getsize(csv_file):>14}{best(load_csv):>10.4f}")
+    print(f"{'Deck file, both directions':<36}{os.path.getsize(deck_file):>14}{best(load_deck):>10.4f}")
+    print(f"{'Deck file, topic names only':<36}{'':>14}{best(lambda: DeckFile.open(deck_file).names()):>10.4f}")
+    os.remove(deck_file)
+
+
+def main(argv=None):
+    """
+    Command line interface of the module.
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(description="WordCards deck files")
+    commands = parser.add_subparsers(dest="command", required=True)
+    imp = commands.add_parser("import", help="convert a CSV file into a deck file")
+    imp.add_argument("csv_file")
+    imp.add_argument("deck_file", nargs="?")
+    imp.add_argument("--topic-column", default="topic")
+    info = commands.add_parser("info", help="show the languages and topics of a deck file")
+    info.add_argument("deck_file")
+    ben = commands.add_parser("bench", help="compare the deck file with the CSV file")
+    ben.add_argument("csv_file")
+    args = parser.parse_args(argv)
+
+    if args.command == "import":
+        deck_file = args.deck_file or os.path.splitext(args.csv_file)[0] + DECK_SUFFIX
+        deck = import_csv(args.csv_file, deck_file, args.topic_column)
+        print(f"{deck_file}: {len(deck)} rows, {len(deck.topics)} topics, languages {', '.join(deck.languages)}")
+    elif args.command == "info":
+        deck = DeckFile.open(args.deck_file)
+        print(f"{len(deck)} rows, languages: {', '.join(deck.languages)}")
+        for topic in deck.names():
+            print(f"  {topic}")
+    else:
+        bench(args.csv_file)
+
+
+if __name__ == "__main__":
+    main()
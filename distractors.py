@@ -0,0 +1,139 @@
+# Description: This module contains the DistractorIndex for the
+# multiple-choice mode: every card shows its answer and 3 plausible wrong
+# answers (distractors) of the same topic.
+#
+# Looking for similar answers in the whole topic for every card would cost
+# O(n) per card. Instead the index is built once per topic and direction:
+# the distinct answers are sorted three times - by their last two letters
+# (the same ending, which in Ukrainian is often the same part of speech)
+# and length, by their first two letters and length, and by length only -
+# and the neighbours of every answer in these orders are its candidates
+# (a sorted-neighbourhood search). So building the index costs three sorts,
+# O(n log n), and the options of a card are a random choice among its few
+# precomputed candidates, O(1); a deck of 10 000 cards gets its options in
+# a few milliseconds.
+#
+# The answers which are accepted for the card (the same normalized form,
+# for example the same word in two topics' rows) are never distractors.
+
+
+import random
+from array import array
+from itertools import permutations
+from typing import Dict, Iterable, List, Sequence
+
+from answer_matching import normalize_answer, split_answers
+
+
+# All ordered choices of 3 of the 6 best candidates, so picking the 3
+# distractors of a card is one random number instead of random.sample()
+_PICKS = list(permutations(range(6), 3))
+
+
+class DistractorIndex:
+    """
+    The precomputed candidates for the distractors of every answer of a topic.
+
+    Parameters:
+        answers: the answers of the cards (one direction of one topic).
+        candidates: how many candidates are kept for every answer (at least).
+        window: how many neighbours on each side are looked at in every order.
+    """
+
+    def __init__(self, answers: Iterable[str], candidates: int = 8, window: int = 3):
+        self.answers: List[str] = []          # The distinct answers (by their normalized form)
+        self.ids: Dict[str, int] = {}         # Answer -> position in self.answers
+        keys: List[str] = []                  # The normalized first form of every answer
+        by_key: Dict[str, int] = {}
+        for answer in answers:
+            if answer in self.ids:
+                continue
+            key = normalize_answer(split_answers(answer)[0])
+            i = by_key.get(key)
+            if i is None:
+                i = by_key[key] = len(self.answers)
+                self.answers.append(answer)
+                keys.append(key)
+            self.ids[answer] = i
+        self._forms = [set(normalize_answer(a) for a in split_answers(answer)) for answer in self.answers]
+
+        n = len(keys)
+        orders = (
+            sorted(range(n), key=lambda i: (keys[i][-2:], len(keys[i]), keys[i])),
+            sorted(range(n), key=lambda i: (keys[i][:2], len(keys[i]), keys[i])),
+            sorted(range(n), key=lambda i: (len(keys[i]), keys[i])),
+        )
+        positions = []
+        for order in orders:
+            pos = array("I", bytes(4 * n))
+            for p, i in enumerate(order):
+                pos[i] = p
+            positions.append(pos)
+
+        # The candidates of answer i are the nearest neighbours in the orders,
+        # the best order first, as a tuple of the answer strings
+        self._candidates: List[tuple] = []
+        for i in range(n):
+            taken = {i}
+            found = []
+            forms = self._forms[i]
+            for order, pos in zip(orders, positions):
+                p = pos[i]
+                for step in range(1, window + 1):
+                    for q in (p - step, p + step):
+                        if 0 <= q < n:
+                            j = order[q]
+                            if j not in taken and not (forms & self._forms[j]):
+                                taken.add(j)
+                                found.append(self.answers[j])
+                if len(found) >= candidates:
+                    break
+            self._candidates.append(tuple(found))
+
+    def __len__(self) -> int:
+        return len(self.answers)
+
+    def distractors(self, answer: str, k: int = 3, rnd: random.Random = random) -> List[str]:
+        """
+        Return k different wrong answers similar to the answer (fewer if the
+        topic does not have enough different answers).
+        """
+        i = self.ids.get(answer)
+        if i is None:
+            return []
+        candidates = self._candidates[i]
+        if len(candidates) <= k:
+            return list(candidates)
+        # The candidates from the best order are the first ones: take
+        # them more often, but not always, so the options change
+        if k == 3 and len(candidates) >= 6:
+            a, b, c = _PICKS[int(rnd.random() * len(_PICKS))]
+            return [candidates[a], candidates[b], candidates[c]]
+        return rnd.sample(candidates[:2 * k], k)
+
+    def options(self, answer: str, k: int = 3, rnd: random.Random = random) -> List[str]:
+        """
+        Return the answer and its k distractors in a random order.
+        """
+        options = self.distractors(answer, k, rnd)
+        options.insert(int(rnd.random() * (len(options) + 1)), answer)
+        return options
+
+    def options_for_deck(self, deck: Sequence, k: int = 3, rnd: random.Random = random) -> List[List[str]]:
+        """
+        Return the options of every card of the deck.
+        """
+        return [self.options(card.answer, k, rnd) for card in deck]
+
+
+def distractor_index(vocabulary, topic: str, direction: str) -> DistractorIndex:
+    """
+    Return the DistractorIndex of the topic in the direction: the cached one
+    if the vocabulary keeps them (TopicCatalog, DeckFile), otherwise a new one.
+    """
+    cached = getattr(vocabulary, "distractor_index", None)
+    if cached is not None:
+        return cached(topic, direction)
+    from deck_format import topic_words
+
+    return DistractorIndex(topic_words(vocabulary, topic, direction).values())
@@ -0,0 +1,210 @@
+# Description: This module contains the instrumentation of the hot paths:
+# counters, latency histograms, the bytes read and written and the response
+# time of every answered card. Everything is recorded into one in-memory
+# registry (REGISTRY) which can be exported as JSON or in the Prometheus
+# text format to a local file.
+#
+# The instrumentation is turned on with the WORDCARDS_METRICS environment
+# variable, its value is the file to export to ("metrics.json", "metrics.prom";
+# "1" means metrics.json). It must be set before the modules are imported:
+# when it is not set, the timed() decorator returns the function itself and
+# inc()/observe() return at once, so the disabled instrumentation costs
+# nothing on the functions and one global check on the explicit calls.
+
+
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+
+
+_TARGET = os.environ.get("WORDCARDS_METRICS", "")
+ENABLED = bool(_TARGET)
+DEFAULT_FILE = "metrics.json"
+
+# Upper bounds of the latency buckets in seconds (Prometheus "le" values).
+# They cover the grading of one answer (microseconds) as well as the time
+# a learner thinks about a card (seconds).
+LATENCY_BUCKETS = (0.00001, 0.0001, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram:
+    """
+    A histogram with fixed buckets: the number of observations not greater
+    than each bound, their sum and their count. Only len(buckets) + 1
+    integers are kept however many values are observed.
+    """
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)   # The last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def to_dict(self):
+        return {
+            "buckets": dict(zip([str(b) for b in self.buckets] + ["+Inf"], self.counts)),
+            "sum": self.sum,
+            "count": self.count,
+        }
+
+
+def _key(name, labels):
+    return (name, tuple(sorted(labels.items())) if labels else ())
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+class Registry:
+    """
+    The counters and histograms of the process. The keys are the metric
+    name and its labels (for example bytes_read_total{file="cards.csv"}).
+    The methods may be called from several threads (the Tk main loop and
+    the TkWorker), so the updates are made under a lock.
+    """
+
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def inc(self, name, value=1, labels=None):
+        key = _key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, labels=None, buckets=LATENCY_BUCKETS):
+        key = _key(name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def clear(self):
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def to_dict(self):
+        """
+        Return the registry as a dictionary for JSON: lists of
+        {"name", "labels", "value"} and {"name", "labels", "buckets", "sum", "count"}.
+        """
+        with self.lock:
+            return {
+                "counters": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in sorted(self.counters.items())
+                ],
+                "histograms": [
+                    {"name": name, "labels": dict(labels), **histogram.to_dict()}
+                    for (name, labels), histogram in sorted(self.histograms.items(), key=lambda item: item[0])
+                ],
+            }
+
+    def to_prometheus(self):
+        """
+        Return the registry in the Prometheus text exposition format.
+        """
+        lines = []
+        with self.lock:
+            typed = set()
+            for (name, labels), value in sorted(self.counters.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {name} counter")
+                    typed.add(name)
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+            for (name, labels), histogram in sorted(self.histograms.items(), key=lambda item: item[0]):
+                if name not in typed:
+                    lines.append(f"# TYPE {name} histogram")
+                    typed.add(name)
+                cumulative = 0
+                for bound, count in zip(list(histogram.buckets) + ["+Inf"], histogram.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum}")
+                lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, path):
+        """
+        Write the registry into the file: in the Prometheus format for the
+        .prom and .txt files, otherwise as JSON. The file is replaced at once,
+        so a scraper never reads a half-written file.
+        """
+        if path.endswith((".prom", ".txt")):
+            text = self.to_prometheus()
+        else:
+            text = json.dumps(self.to_dict(), ensure_ascii=False, indent=2)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp, path)
+
+
+REGISTRY = Registry()
+
+
+def inc(name, value=1, labels=None):
+    """
+    Add the value to the counter (if the instrumentation is on).
+    """
+    if ENABLED:
+        REGISTRY.inc(name, value, labels)
+
+
+def observe(name, value, labels=None):
+    """
+    Put the value (in seconds) into the latency histogram (if the instrumentation is on).
+    """
+    if ENABLED:
+        REGISTRY.observe(name, value, labels)
+
+
+def timed(name):
+    """
+    Decorator which counts the calls of the function into <name>_calls_total
+    and their durations into the <name>_seconds histogram. With the
+    instrumentation off it returns the function itself, so there is no
+    overhead at all.
+    """
+    def decorator(fn):
+        if not ENABLED:
+            return fn
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                REGISTRY.observe(name + "_seconds", time.perf_counter() - start)
+                REGISTRY.inc(name + "_calls_total")
+        return wrapper
+    return decorator
+
+
+def export(path=None):
+    """
+    Write the registry into the file given by WORDCARDS_METRICS (or the
+    path) and return the path, or None when the instrumentation is off.
+    """
+    if not ENABLED:
+        return None
+    path = path or (DEFAULT_FILE if _TARGET == "1" else _TARGET)
+    REGISTRY.export(path)
+    return path
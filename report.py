@@ -0,0 +1,282 @@
+# Description: This module makes the reports over the results of many
+# learners (for example, the end-of-week report of a whole cohort).
+#
+# Every learner has a results folder (see results_store): "history.jsonl"
+# with one numeric entry per round, or only the old "saved_result.json".
+# The files are summarized in a pool of processes, one file per task; each
+# task reads its file line by line and returns a small partial summary
+# (counters per topic and per missed word and the streaks of the learner),
+# and the main process merges the partial summaries as they arrive. Nothing
+# grows with the number of files except the per-learner rows, so the report
+# scales with the number of cores.
+#
+# The report is written as CSV files (topics, learners, hardest words) and
+# one JSON file with everything.
+#
+# Usage:
+#   python report.py cohort/ --out report/ --workers 8
+#   python report.py learner1/results learner2/results --out report/ --top 20
+
+
+import argparse
+import csv
+import json
+import os
+from datetime import date, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from results_store import LEGACY_NAME, LOG_NAME, parse_legacy
+
+
+def find_results(paths: Iterable[str]) -> Iterator[Tuple[str, str]]:
+    """
+    Yield (learner, file) for every results file under the paths.
+
+    A path can be a results file itself or a folder, which is searched
+    recursively for "history.jsonl" (or "saved_result.json" where there is
+    no log yet). The learner is the folder of the file relative to the path.
+    """
+    for path in paths:
+        if os.path.isfile(path):
+            yield path, path
+            continue
+        for folder, _, files in os.walk(path):
+            name = LOG_NAME if LOG_NAME in files else LEGACY_NAME if LEGACY_NAME in files else None
+            if name is not None:
+                learner = os.path.relpath(folder, path)
+                yield (path if learner == "." else learner), os.path.join(folder, name)
+
+
+def _iter_entries(file: str) -> Iterator[dict]:
+    """
+    Yield the entries of a results log (the broken lines are skipped)
+    or of the old saved_result.json file.
+    """
+    if os.path.basename(file) == LEGACY_NAME:
+        try:
+            with open(file, encoding="utf-8") as f:
+                legacy = json.load(f)
+        except (OSError, ValueError):
+            return
+        if isinstance(legacy, dict):
+            yield from parse_legacy(legacy)
+        return
+    with open(file, "rb") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(entry, dict):
+                yield entry
+
+
+def _streaks(days: Iterable[date], today: date) -> Tuple[int, int]:
+    """
+    Return (longest, current) number of consecutive days with practice.
+    The current streak is kept if the last practice was today or yesterday.
+    """
+    longest = run = 0
+    previous = None
+    for day in sorted(set(days)):
+        run = run + 1 if previous is not None and day - previous == timedelta(days=1) else 1
+        longest = max(longest, run)
+        previous = day
+    current = run if previous is not None and today - previous <= timedelta(days=1) else 0
+    return longest, current
+
+
+def summarize_file(task: Tuple[str, str, str, bool]) -> dict:
+    """
+    Return the partial summary of one results file.
+
+    The task is (learner, file, today as ISO date, include_retries). It runs
+    in the worker processes, so it takes and returns only plain data:
+        {"learner": {...one row...},
+         "topics": {topic: [rounds, correct, total]},
+         "words": {(topic, direction, word): misses}}
+    The rounds of the work on mistakes are skipped unless include_retries.
+    """
+    learner, file, today, include_retries = task
+    topics: Dict[str, List[int]] = {}
+    words: Dict[Tuple[str, str, str], int] = {}
+    days = set()
+    rounds = correct = total = 0
+    for entry in _iter_entries(file):
+        try:
+            topic, right, count = entry["topic"], int(entry["correct"]), int(entry["total"])
+            day = date.fromisoformat(entry["date"][:10])
+        except (KeyError, TypeError, ValueError):
+            continue  # Only this entry is broken
+        days.add(day)  # The work on mistakes is practice too
+        if entry.get("retry") and not include_retries:
+            continue
+        stats = topics.get(topic)
+        if stats is None:
+            stats = topics[topic] = [0, 0, 0]
+        stats[0] += 1
+        stats[1] += right
+        stats[2] += count
+        rounds += 1
+        correct += right
+        total += count
+        direction = entry.get("direction", "")
+        for word in entry.get("wrong", ()):
+            key = (topic, direction, word)
+            words[key] = words.get(key, 0) + 1
+    longest, current = _streaks(days, date.fromisoformat(today))
+    return {
+        "learner": {
+            "learner": learner,
+            "rounds": rounds,
+            "correct": correct,
+            "total": total,
+            "accuracy": round(correct / total, 4) if total else None,
+            "topics": len(topics),
+            "last_date": max(days).isoformat() if days else None,
+            "longest_streak_days": longest,
+            "current_streak_days": current,
+        },
+        "topics": topics,
+        "words": words,
+    }
+
+
+class CohortReport:
+    """
+    The streaming reducer of the partial summaries: add() merges one
+    partial summary into the totals, so the partial summaries are not kept.
+    """
+
+    def __init__(self):
+        self.learners: List[dict] = []
+        self.topics: Dict[str, List[int]] = {}              # topic -> [learners, rounds, correct, total]
+        self.words: Dict[Tuple[str, str, str], List[int]] = {}  # (topic, direction, word) -> [misses, learners]
+
+    def add(self, partial: dict) -> None:
+        self.learners.append(partial["learner"])
+        for topic, (rounds, correct, total) in partial["topics"].items():
+            stats = self.topics.get(topic)
+            if stats is None:
+                stats = self.topics[topic] = [0, 0, 0, 0]
+            stats[0] += 1
+            stats[1] += rounds
+            stats[2] += correct
+            stats[3] += total
+        for key, misses in partial["words"].items():
+            stats = self.words.get(key)
+            if stats is None:
+                stats = self.words[key] = [0, 0]
+            stats[0] += misses
+            stats[1] += 1
+
+    def topic_rows(self) -> List[dict]:
+        """
+        Return the rows of the topics, the least accurate first.
+        """
+        rows = [
+            {"topic": topic, "learners": learners, "rounds": rounds, "correct": correct, "total": total,
+             "accuracy": round(correct / total, 4) if total else None}
+            for topic, (learners, rounds, correct, total) in self.topics.items()
+        ]
+        rows.sort(key=lambda row: (row["accuracy"] is None, row["accuracy"] or 0, row["topic"]))
+        return rows
+
+    def hardest_words(self, top: int = 10) -> List[dict]:
+        """
+        Return the "top" most missed words of every topic.
+        """
+        by_topic: Dict[str, List[dict]] = {}
+        for (topic, direction, word), (misses, learners) in self.words.items():
+            by_topic.setdefault(topic, []).append(
+                {"topic": topic, "direction": direction, "word": word, "misses": misses, "learners": learners})
+        rows = []
+        for topic in sorted(by_topic):
+            words = sorted(by_topic[topic], key=lambda row: (-row["misses"], -row["learners"], row["word"]))
+            rows.extend(words[:top])
+        return rows
+
+    def learner_rows(self) -> List[dict]:
+        return sorted(self.learners, key=lambda row: row["learner"])
+
+
+def build_report(paths: Iterable[str], workers: Optional[int] = None, today: Optional[date] = None,
+                 include_retries: bool = False, chunk_size: int = 16) -> CohortReport:
+    """
+    Summarize all the results files under the paths and return the CohortReport.
+
+    With workers > 1 the files are summarized in a pool of processes by
+    chunks of chunk_size files; with one worker they are read in this process.
+    """
+    today_iso = (today or date.today()).isoformat()
+    tasks = [(learner, file, today_iso, include_retries) for learner, file in find_results(paths)]
+    report = CohortReport()
+    workers = workers or os.cpu_count() or 1
+    if workers > 1 and len(tasks) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(workers) as pool:
+            for partial in pool.map(summarize_file, tasks, chunksize=chunk_size):
+                report.add(partial)
+    else:
+        for task in tasks:
+            report.add(summarize_file(task))
+    return report
+
+
+def _write_csv(path: str, rows: List[dict], fields: List[str]) -> None:
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def write_report(report: CohortReport, out_dir: str, top: int = 10) -> Dict[str, str]:
+    """
+    Write topics.csv, learners.csv, hardest_words.csv and summary.json into
+    the folder and return the paths of the files.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    topics, learners, words = report.topic_rows(), report.learner_rows(), report.hardest_words(top)
+    paths = {name: os.path.join(out_dir, name) for name in ("topics.csv", "learners.csv", "hardest_words.csv", "summary.json")}
+    _write_csv(paths["topics.csv"], topics, ["topic", "learners", "rounds", "correct", "total", "accuracy"])
+    _write_csv(paths["learners.csv"], learners, ["learner", "rounds", "correct", "total", "accuracy", "topics",
+                                                 "last_date", "longest_streak_days", "current_streak_days"])
+    _write_csv(paths["hardest_words.csv"], words, ["topic", "direction", "word", "misses", "learners"])
+    correct = sum(row["correct"] for row in learners)
+    total = sum(row["total"] for row in learners)
+    summary = {
+        "learners": len(learners),
+        "rounds": sum(row["rounds"] for row in learners),
+        "accuracy": round(correct / total, 4) if total else None,
+        "topics": topics,
+        "learner_rows": learners,
+        "hardest_words": words,
+    }
+    with open(paths["summary.json"], "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    return paths
+
+
+def main(argv=None):
+    """
+    Command line interface of the module.
+    """
+    parser = argparse.ArgumentParser(description="WordCards cohort report")
+    parser.add_argument("paths", nargs="+", help="results folders (searched recursively) or results files")
+    parser.add_argument("--out", default="report", help="folder for the CSV and JSON files")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="number of processes")
+    parser.add_argument("--top", type=int, default=10, help="hardest words per topic")
+    parser.add_argument("--today", type=date.fromisoformat, default=None, help="the date for the current streaks (YYYY-MM-DD)")
+    parser.add_argument("--include-retries", action="store_true", help="count the rounds of the work on mistakes")
+    args = parser.parse_args(argv)
+
+    report = build_report(args.paths, args.workers, args.today, args.include_retries)
+    paths = write_report(report, args.out, args.top)
+    print(f"{len(report.learners)} learners, {len(report.topics)} topics")
+    for path in paths.values():
+        print(path)
+
+
+if __name__ == "__main__":
+    main()
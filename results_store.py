@@ -0,0 +1,536 @@
+# Description: This module contains the ResultsStore class, which keeps
+# the results of the practiced topics.
+#
+# Every finished round is appended as one JSON line to "history.jsonl",
+# so saving a round costs the same no matter how long the history is, and
+# the full history of every topic is kept. The latest result of each topic
+# is kept in memory; from time to time it is written into "latest.json"
+# together with the position in the log it covers (compaction), so the
+# start of the application reads only the small snapshot and the tail of
+# the log.
+#
+# The in-memory index is a cache: lookup() checks (at most once per second)
+# whether another process changed the log, by its inode, size and
+# modification time, and reads only the new lines if it did. The CacheStats
+# counters show how often the cache was enough and how much I/O it saved.
+#
+# Every entry is a JSON object with numbers, not text for the user:
+#   {"topic": str, "date": ISO date and time, "correct": int, "total": int,
+#    "direction": str, "wrong": [prompts of the missed cards], "retry": true}
+# The last three keys are written only when they are known (the old entries
+# and the imported ones do not have them); "retry" marks the work on mistakes.
+# The report module aggregates these files of many learners.
+#
+# The old "saved_result.json" file (only the last date and result of each
+# topic as strings) is imported into the log the first time the store is opened.
+#
+# The SessionJournal keeps the round which is in progress in "session.jsonl":
+# the deck in the first line and then one short line per answered card, so
+# the round can be resumed after a crash or after closing the window.
+#
+# The states of the spaced-repetition Scheduler are kept in "schedule.json",
+# and the attempts and misses of every card (CardStats) in the binary file
+# "card_stats.bin": the keys and the three number columns as raw arrays.
+# The bytes read and written, the fsync times and the timings of the main
+# methods are reported to the metrics module when the instrumentation is on.
+
+
+import json
+import marshal
+import os
+import re
+import sys
+import time
+from datetime import datetime
+
+import metrics
+from services_quiz_engine import CardStats, Scheduler
+
+
+LOG_NAME = "history.jsonl"
+SNAPSHOT_NAME = "latest.json"
+SCHEDULE_NAME = "schedule.json"
+CARD_STATS_NAME = "card_stats.bin"
+CARD_STATS_VERSION = 1
+LEGACY_NAME = "saved_result.json"
+JOURNAL_NAME = "session.jsonl"
+
+DATE_FORMAT = "%d.%m.%Y"    # The date format shown to the user
+_LEGACY_RESULT = re.compile(r"(\d+)\s*/\s*(\d+)")
+
+
+def _fsync_dir(path):
+    """
+    Make the rename inside the folder durable (not supported on Windows).
+    """
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def atomic_write_json(path, data):
+    """
+    Write the data as JSON into a temporary file, flush it to the disk and
+    rename it over the old file, so the file is either old or new, never broken.
+    """
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+        metrics.inc("bytes_written_total", os.fstat(f.fileno()).st_size, {"source": "results"})
+    os.replace(tmp, path)
+    _fsync_dir(os.path.dirname(path) or ".")
+
+
+def format_result(entry):
+    """
+    Return the text about the entry for the label on the Home screen.
+    """
+    day = datetime.fromisoformat(entry["date"]).strftime(DATE_FORMAT)
+    return f"Дата проходження теми: {day}.\nРезультат: Правильних відповідей {entry['correct']}/{entry['total']}."
+
+
+def parse_legacy(legacy):
+    """
+    Return the entries of the old saved_result.json content
+    ({topic: {"Дата": "dd.mm.yyyy", "Результат": "... 3/20."}}),
+    skipping the values which can not be parsed.
+    """
+    entries = []
+    for topic, value in legacy.items():
+        try:
+            day = datetime.strptime(value["Дата"], DATE_FORMAT)
+            correct, total = _LEGACY_RESULT.search(value["Результат"]).groups()
+        except (KeyError, TypeError, ValueError, AttributeError):
+            continue
+        entries.append({"topic": topic, "date": day.isoformat(), "correct": int(correct), "total": int(total)})
+    return entries
+
+
+class CacheStats:
+    """
+    Counters of the results cache for one session.
+
+    Attributes:
+        lookups: how many times a topic result was asked for.
+        hits: lookups answered from memory without reading the file.
+        checks: how many times the log file was checked with os.stat().
+        reloads: how many times the changed log was read again.
+        bytes_read: bytes of the log read because of the changes.
+        bytes_avoided: bytes a full re-read on every lookup would have read.
+    """
+
+    def __init__(self):
+        self.lookups = 0
+        self.hits = 0
+        self.checks = 0
+        self.reloads = 0
+        self.bytes_read = 0
+        self.bytes_avoided = 0
+
+    @property
+    def hit_rate(self):
+        return self.hits / self.lookups if self.lookups else 0.0
+
+    def summary(self):
+        """
+        Return one line with the counters for printing.
+        """
+        return (f"results cache: {self.lookups} lookups, hit rate {self.hit_rate:.0%}, "
+                f"{self.checks} stat checks, {self.reloads} reloads, "
+                f"{self.bytes_read} bytes read, {self.bytes_avoided} bytes of I/O avoided")
+
+
+class ResultsStore:
+    """
+    Append-only store of the quiz results in the results_dir folder.
+
+    Attributes:
+        latest (dict): topic -> the latest entry of the topic. An entry is
+            a dictionary with the keys "topic", "date" (ISO format),
+            "correct" and "total".
+    """
+
+    def __init__(self, results_dir, compact_every=100, check_interval=1.0):
+        self.results_dir = results_dir
+        self.compact_every = compact_every
+        self.check_interval = check_interval    # Seconds between the checks of the log file
+        self.stats = CacheStats()
+        self.log_path = os.path.join(results_dir, LOG_NAME)
+        self.snapshot_path = os.path.join(results_dir, SNAPSHOT_NAME)
+        self.latest = {}
+        self._log_size = 0          # Bytes of the log already applied to latest
+        self._torn_tail = False     # The log ends with a half-written line
+        self._appended = 0          # Appends since the last compaction
+        self._signature = None      # (inode, size, mtime) of the log we know about
+        self._checked_at = 0.0      # time.monotonic() of the last check
+        self.load()
+
+    def load(self):
+        """
+        Read the snapshot and the tail of the log after it.
+        """
+        os.makedirs(self.results_dir, exist_ok=True)
+        self.latest = {}
+        self._log_size = 0
+        try:
+            with open(self.snapshot_path, encoding="utf-8") as f:
+                snapshot = json.load(f)
+            self.latest = snapshot["latest"]
+            self._log_size = snapshot["log_offset"]
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+        if not os.path.exists(self.log_path):
+            self.latest, self._log_size = {}, 0
+            self._import_legacy()
+            self._signature = self._stat_signature()
+            return
+        if os.path.getsize(self.log_path) < self._log_size:
+            # The log is shorter than the snapshot says, so read it all again
+            self.latest, self._log_size = {}, 0
+        self._replay()
+        self._signature = self._stat_signature()
+        self._checked_at = time.monotonic()
+
+    def _stat_signature(self, st=None):
+        """
+        Return (inode, size, mtime) of the log or None if it does not exist.
+        """
+        if st is None:
+            try:
+                st = os.stat(self.log_path)
+            except OSError:
+                return None
+        return st.st_ino, st.st_size, st.st_mtime_ns
+
+    def refresh(self, force=False):
+        """
+        Read the changes of the log made by other processes.
+
+        The log is checked with one os.stat() call, not more often than once
+        per check_interval seconds (unless force is True). If only new lines
+        were appended, only they are read; if the file was replaced or cut,
+        the whole store is loaded again.
+
+        Returns True if the file was read.
+        """
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.check_interval:
+            return False
+        self._checked_at = now
+        self.stats.checks += 1
+        signature = self._stat_signature()
+        if signature == self._signature:
+            return False
+
+        self.stats.reloads += 1
+        old = self._signature
+        if signature is not None and old is not None and signature[0] == old[0] and signature[1] >= self._log_size:
+            self.stats.bytes_read += signature[1] - self._log_size
+            self._replay()
+            self._signature = signature
+        else:
+            self.load()
+            self.stats.bytes_read += signature[1] if signature else 0
+        return True
+
+    @metrics.timed("results_lookup")
+    def lookup(self, topic):
+        """
+        Return the latest entry of the topic or None, checking the log for
+        changes made by other processes first.
+        """
+        self.stats.lookups += 1
+        if not self.refresh():
+            self.stats.hits += 1
+            self.stats.bytes_avoided += self._log_size
+        return self.latest.get(topic)
+
+    def _replay(self):
+        """
+        Apply the complete lines of the log after the already applied part.
+        The lines which can not be parsed are skipped.
+        """
+        with open(self.log_path, "rb") as f:
+            f.seek(self._log_size)
+            data = f.read()
+        metrics.inc("bytes_read_total", len(data), {"source": "results"})
+        end = data.rfind(b"\n") + 1
+        self._torn_tail = end < len(data)
+        for line in data[:end].splitlines():
+            try:
+                entry = json.loads(line)
+                self.latest[entry["topic"]] = entry
+            except (ValueError, KeyError, TypeError):
+                continue
+        self._log_size += end
+
+    def _import_legacy(self):
+        """
+        Move the results from the old saved_result.json file into the log.
+        """
+        legacy_path = os.path.join(self.results_dir, LEGACY_NAME)
+        try:
+            with open(legacy_path, encoding="utf-8") as f:
+                legacy = json.load(f)
+        except (OSError, ValueError):
+            return
+        entries = parse_legacy(legacy) if isinstance(legacy, dict) else []
+        if entries:
+            self._write(entries)
+            self.compact()
+
+    def _write(self, entries):
+        """
+        Append the entries to the log and flush them to the disk.
+        """
+        data = "".join(json.dumps(e, ensure_ascii=False) + "\n" for e in entries).encode("utf-8")
+        with open(self.log_path, "ab") as f:
+            if os.fstat(f.fileno()).st_size != self._log_size:
+                # Another process wrote into the log (or it ends with a broken
+                # line after a crash), read the new lines first
+                self._replay()
+            if self._torn_tail:
+                data = b"\n" + data  # Finish the broken line, it will be skipped when reading
+                self._torn_tail = False
+            f.write(data)
+            f.flush()
+            start = time.perf_counter()
+            os.fsync(f.fileno())
+            metrics.observe("results_fsync_seconds", time.perf_counter() - start)
+            st = os.fstat(f.fileno())
+        metrics.inc("bytes_written_total", len(data), {"source": "results"})
+        self._log_size = st.st_size
+        self._signature = self._stat_signature(st)
+        for entry in entries:
+            self.latest[entry["topic"]] = entry
+
+    @metrics.timed("results_append")
+    def append(self, topic, correct, total, when=None, direction=None, wrong=None, retry=False):
+        """
+        Save the result of one round and return its entry.
+        The direction, the prompts of the wrong cards and the retry flag
+        are optional (see the schema at the top of the module).
+        """
+        when = when or datetime.now()
+        entry = {"topic": topic, "date": when.isoformat(timespec="seconds"), "correct": correct, "total": total}
+        if direction:
+            entry["direction"] = direction
+        if wrong is not None:
+            entry["wrong"] = list(wrong)
+        if retry:
+            entry["retry"] = True
+        self._write([entry])
+        self._appended += 1
+        if self._appended >= self.compact_every:
+            self.compact()
+        return entry
+
+    def compact(self):
+        """
+        Write the latest entries and the covered part of the log into the snapshot.
+        """
+        atomic_write_json(self.snapshot_path, {"log_offset": self._log_size, "latest": self.latest})
+        self._appended = 0
+
+    def close(self):
+        """
+        Compact the store if there are new entries since the last compaction.
+        """
+        if self._appended:
+            self.compact()
+
+    def history(self, topic=None):
+        """
+        The generator yields all entries of the log (or only of the topic) from the oldest.
+        """
+        if not os.path.exists(self.log_path):
+            return
+        with open(self.log_path, "rb") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if topic is None or entry.get("topic") == topic:
+                    yield entry
+
+
+@metrics.timed("load_schedule")
+def load_schedule(results_dir):
+    """
+    Return the Scheduler saved in the results_dir folder (an empty one if there is none).
+    """
+    try:
+        with open(os.path.join(results_dir, SCHEDULE_NAME), encoding="utf-8") as f:
+            return Scheduler.from_rows(json.load(f))
+    except (OSError, ValueError, TypeError):
+        return Scheduler()
+
+
+@metrics.timed("save_schedule")
+def save_schedule(results_dir, scheduler):
+    """
+    Save the states of the Scheduler into the results_dir folder.
+    """
+    os.makedirs(results_dir, exist_ok=True)
+    atomic_write_json(os.path.join(results_dir, SCHEDULE_NAME), scheduler.to_rows())
+
+
+@metrics.timed("load_card_stats")
+def load_card_stats(results_dir):
+    """
+    Return the CardStats saved in the results_dir folder (an empty one if
+    there is none, or if it was saved on a machine with another byte order).
+    """
+    try:
+        with open(os.path.join(results_dir, CARD_STATS_NAME), "rb") as f:
+            data = f.read()
+        metrics.inc("bytes_read_total", len(data), {"source": "card_stats"})
+        version, byteorder, payload = marshal.loads(data)
+        if version != CARD_STATS_VERSION or byteorder != sys.byteorder:
+            return CardStats()
+        return CardStats.from_payload(payload)
+    except (OSError, EOFError, ValueError, TypeError):
+        return CardStats()
+
+
+@metrics.timed("save_card_stats")
+def save_card_stats(results_dir, stats):
+    """
+    Save the CardStats into the results_dir folder (the file is replaced at once).
+    """
+    os.makedirs(results_dir, exist_ok=True)
+    path = os.path.join(results_dir, CARD_STATS_NAME)
+    data = marshal.dumps((CARD_STATS_VERSION, sys.byteorder, stats.to_payload()))
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    _fsync_dir(results_dir)
+    metrics.inc("bytes_written_total", len(data), {"source": "card_stats"})
+
+
+class SessionJournal:
+    """
+    The journal of the round in progress, for resuming it later.
+
+    start() writes the deck of the round (prompts and answers in the order
+    they are asked) and the round settings as the first line; record()
+    appends one line {"i": position, "g": grade} per answered or skipped
+    card. The lines are only flushed to the operating system, not fsynced,
+    so a record costs a few microseconds and survives a crash of the
+    application (an answer or two may be lost if the whole computer stops).
+    The journal is deleted by discard() when the result of the round is saved.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def start(self, topic, direction, deck, retry=False, multiple_choice=False):
+        """
+        Begin the journal of a new round (the old journal is replaced).
+        """
+        self.close()
+        header = {
+            "topic": topic,
+            "direction": direction,
+            "retry": retry,
+            "multiple_choice": multiple_choice,
+            "started": datetime.now().isoformat(timespec="seconds"),
+            "prompts": [card.prompt for card in deck],
+            "answers": [card.answer for card in deck],
+        }
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._file = open(self.path, "wb")
+        self._file.write(json.dumps(header, ensure_ascii=False).encode("utf-8") + b"\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())  # Once per round, the deck must not be lost
+
+    def reopen(self, size):
+        """
+        Continue the journal read by load(): the broken last line (if any)
+        is cut off at size and the new records are appended after it.
+        """
+        self.close()
+        self._file = open(self.path, "r+b")
+        self._file.truncate(size)
+        self._file.seek(size)
+
+    @metrics.timed("journal_record")
+    def record(self, index, grade):
+        """
+        Append the grade of the card at the position index.
+        """
+        if self._file is None:
+            return
+        self._file.write(b'{"i":%d,"g":"%s"}\n' % (index, grade.encode("ascii")))
+        self._file.flush()
+
+    def close(self):
+        """
+        Close the journal, keeping the file for the next launch.
+        """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def discard(self):
+        """
+        Close and delete the journal of the finished round.
+        """
+        self.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def load(self):
+        """
+        Return the saved round as a dictionary (the fields written by start()
+        plus "grades", the grades of the answered cards in order, and "size",
+        the length of the valid part of the file, up to the first broken
+        record), or None if there is no journal or it is broken.
+        When all the cards have grades the round was answered but maybe not
+        saved (the window was closed before the result was shown), so it is
+        returned too; the caller can tell it by len(grades) == len(prompts).
+        """
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        lines = data.split(b"\n")[:-1]  # A torn last line (without "\n") is ignored
+        try:
+            state = json.loads(lines[0])
+            prompts, answers = state["prompts"], state["answers"]
+        except (IndexError, ValueError, KeyError, TypeError):
+            return None
+        if len(prompts) != len(answers):
+            return None
+        grades = []
+        size = len(lines[0]) + 1
+        for line in lines[1:]:
+            try:
+                event = json.loads(line)
+            except ValueError:
+                break
+            if not isinstance(event, dict) or event.get("i") != len(grades) or len(grades) == len(prompts):
+                break  # Only the records in the order of the cards are valid
+            grades.append(event.get("g"))
+            size += len(line) + 1
+        state["grades"] = grades
+        state["size"] = size
+        return state
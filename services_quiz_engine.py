@@ -8,33 +8,220 @@
 # was used the typing standard module.
 # The idea of using the dataclasses standard module was to pay attention
 # which type of instance of each class has
+# The Scheduler class is a spaced-repetition (SM-2) engine: it keeps the
+# ease, interval and due time of every practiced card and a priority queue
+# of due times, so the next due cards are found without scanning everything.
+# The grade_batch() and grade_columns() functions grade many answers at once
+# (for example, the exported answer sheets of a whole classroom).
+# With an AnswerIndex (see answer_matching) the answers are matched with
+# tolerance to typos, and the near misses are reported apart from the wrong ones.
+# The Deck class keeps the prompts and answers of a topic in shared columns
+# and shuffles only a permutation of row numbers; the wrong cards of a round
+# are a view of the same columns, so no Card objects are copied.
+# The QuizSession class is the state of one round without any UI (the Tkinter
+# app and the console functions are its clients), and AsyncQuizEngine serves
+# many sessions at once in one process through an asyncio interface.
+# The CardStats class counts the attempts and misses of every card, and
+# make_deck(mode="hard") uses them to put the hard cards first: a deck of
+# size k is sampled from an alias table in O(n + k), while the whole topic
+# (what the application asks for) is a weighted random order, a sort by
+# random keys in O(n log n).
+# The QuizSession measures how long the learner needed for every card, and
+# make_deck(), check_answer() and run_quiz_round() are timed by the metrics
+# module when the instrumentation is on.
 
 
-from dataclasses import dataclass
+from array import array
+from collections.abc import Sequence
+from dataclasses import dataclass, field
+import heapq
+import itertools
 import random
-from typing import Dict, List, Tuple
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
 
+import metrics
+from answer_matching import EXACT, NEAR, WRONG, AnswerIndex, split_answers
 
-@dataclass
+SKIPPED = "skip"  # The grade of a skipped card in the session journal
+
+
+@dataclass(slots=True)
 class Card:
     prompt: str
     answer: str
+    # The normalized answer is computed once and kept on the card
+    _normalized: Optional[str] = field(default=None, init=False, repr=False, compare=False)
+
+    @property
+    def normalized_answer(self) -> str:
+        if self._normalized is None:
+            self._normalized = normalize(self.answer)
+        return self._normalized
+
+    @property
+    def accepted_answers(self) -> Tuple[str, ...]:
+        """
+        All answers the card accepts ("макет|план" accepts both words,
+        "TCP/IP" is one answer).
+        """
+        return split_answers(self.answer)
+
+class _Columns:
+    """
+    The columns shared by a Deck and all its views.
+    """
+    __slots__ = ("prompts", "answers", "normalized")
+
+    def __init__(self, prompts: List[str], answers: List[str]):
+        self.prompts = prompts
+        self.answers = answers
+        self.normalized: Optional[List[str]] = None  # Normalized answers, made on the first use
+
+class Deck(Sequence):
+    """
+    The deck of cards stored as columns.
+
+    The prompts and answers are kept in two lists shared by the deck and all
+    its subsets, and the deck itself is only an array of row numbers in the
+    order the cards are shown. Shuffling the deck shuffles that array, and
+    a subset (for example, the wrong cards of a round) is a new array over
+    the same columns. The Card objects are made only when they are asked for.
+    """
+    __slots__ = ("_columns", "order")
+
+    def __init__(self, prompts: List[str], answers: List[str], order: Optional[array] = None):
+        self._columns = prompts if isinstance(prompts, _Columns) else _Columns(prompts, answers)
+        self.order = order if order is not None else array("I", range(len(self._columns.prompts)))
+
+    @classmethod
+    def from_dict(cls, topic_dict: Dict[str, str]) -> "Deck":
+        """
+        Create the deck of the cards word -> translation of the dictionary.
+        """
+        return cls(list(topic_dict.keys()), list(topic_dict.values()))
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return Deck(self._columns, None, self.order[i])
+        row = self.order[i]
+        columns = self._columns
+        card = Card(columns.prompts[row], columns.answers[row])
+        if columns.normalized is not None:
+            card._normalized = columns.normalized[row]
+        return card
 
-def make_deck(topic_dict: Dict[str, str]) -> List[Card]:
+    def __repr__(self) -> str:
+        return f"Deck({len(self)} cards)"
+
+    def shuffle(self) -> None:
+        """
+        Shuffle the order of the cards in place.
+        """
+        random.shuffle(self.order)
+
+    def shuffled(self) -> "Deck":
+        """
+        Return a shuffled copy of the deck which shares the same columns.
+        """
+        deck = Deck(self._columns, None, array("I", self.order))
+        deck.shuffle()
+        return deck
+
+    def subset(self, positions: Iterable[int]) -> "Deck":
+        """
+        Return the deck of the cards at the given positions of this deck,
+        sharing the same columns.
+        """
+        order = self.order
+        return Deck(self._columns, None, array("I", (order[i] for i in positions)))
+
+    def prompts(self) -> List[str]:
+        """
+        Return the prompts in the order of the deck.
+        """
+        prompts = self._columns.prompts
+        return [prompts[row] for row in self.order]
+
+    def normalized_answers(self) -> List[str]:
+        """
+        Return the normalized answers in the order of the deck. The whole
+        answer column is normalized once and shared by all views.
+        """
+        columns = self._columns
+        if columns.normalized is None:
+            columns.normalized = [normalize(answer) for answer in columns.answers]
+        normalized = columns.normalized
+        return [normalized[row] for row in self.order]
+
+def _normalized_answers(deck: Sequence) -> List[str]:
+    """
+    Return the normalized answers of the deck (a Deck or a list of Cards).
+    """
+    if isinstance(deck, Deck):
+        return deck.normalized_answers()
+    return [card.normalized_answer for card in deck]
+
+def _pick(deck: Sequence, positions: List[int]) -> Sequence:
+    """
+    Return the cards of the deck at the positions: a view for a Deck,
+    a list for a list of Cards.
+    """
+    if isinstance(deck, Deck):
+        return deck.subset(positions)
+    return [deck[i] for i in positions]
+
+@metrics.timed("make_deck")
+def make_deck(topic_dict: Dict[str, str], mode: str = "all", scheduler: Optional["Scheduler"] = None,
+              topic: str = "", direction: str = "", now: Optional[float] = None,
+              stats: Optional["CardStats"] = None, size: Optional[int] = None) -> Deck:
     """
     The function creates a deck of cards which depends on the user's choice
     whether it was the direction "English to Ukranian" or "Ukrainian to English".
     The direction is set on the first screen "home".
     
-    Its behavior includes transforming the dictionary into the list
-    of tuples ("word", "translation"), creating list of Card objects and 
+    Its behavior includes transforming the dictionary into the columns
+    of words and translations, creating the Deck of them and 
     shuffling the deck to provide the user with unexpected words topic sequence.
+
+    With mode="due" the deck has only the cards the scheduler says are due
+    for the review (topic and direction are needed to find them): the most
+    overdue cards go first and the never practiced cards are shuffled after them.
+
+    With mode="hard" the cards are sampled with the weights given by the
+    CardStats (stats, topic and direction are needed), so the cards which
+    are often missed tend to come first. With size only that many cards
+    are taken; the sampling then costs O(size) after the O(n) table.
+    Without size (or for more than half of the topic) the whole weighted
+    order is needed, which is a sort, O(n log n).
     """
     # direction: "English to Ukrainian" or "Ukrainian to English"
-    items = list(topic_dict.items())
-    deck = [Card(k, v) for k, v in items]
-    random.shuffle(deck)
-    return deck
+    if mode == "due":
+        if scheduler is None:
+            raise ValueError("mode='due' needs a scheduler")
+        now = time.time() if now is None else now
+        due, new = [], []
+        for k, v in topic_dict.items():
+            state = scheduler.states.get(card_key(topic, k, direction))
+            if state is None:
+                new.append((k, v))
+            elif state.due <= now:
+                due.append((state.due, k, v))
+        due.sort(key=lambda row: row[0])
+        random.shuffle(new)
+        rows = [(k, v) for _, k, v in due] + new
+        return Deck([k for k, _ in rows], [v for _, v in rows])
+    deck = Deck.from_dict(topic_dict)
+    if mode == "hard":
+        if stats is None:
+            raise ValueError("mode='hard' needs the card stats")
+        weights = stats.weights(topic, direction, deck.prompts())
+        return deck.subset(weighted_sample(weights, size))
+    deck.shuffle()
+    return deck if size is None else deck[:size]
 
 def normalize(s: str) -> str:
     """
@@ -47,20 +234,41 @@ def normalize(s: str) -> str:
     """
     return " ".join(s.strip().lower().split())
 
+@metrics.timed("check_answer")
 def check_answer(user: str, card: Card) -> bool:
     """
     The function checks the user's answer and return "True", 
     if it is correct and "False", if it isn't.
     """
-    return normalize(user) == normalize(card.answer)
+    return normalize(user) == card.normalized_answer
+
+@metrics.timed("grade_answer")
+def grade_answer(user: str, card: Card, index: Optional[AnswerIndex] = None) -> str:
+    """
+    The function grades the user's answer and returns EXACT, NEAR (a small
+    typo, a different apostrophe etc.) or WRONG. Without the index only
+    the exact answer (like in check_answer) is accepted.
+    It is what QuizSession.submit() grades with (in the application and in
+    the console), so its timings are the grading of the real sessions.
+    """
+    if index is None:
+        return EXACT if check_answer(user, card) else WRONG
+    return index.grade(user, card.answer)
 
 @dataclass
 class Result:
     total: int
     correct: int
-    wrong_cards: List[Card]
+    wrong_cards: Sequence[Card]
+    # Cards answered with a small typo; they are counted as correct
+    # or wrong depending on MatchConfig.near_miss_is_correct
+    near_miss_cards: Sequence[Card] = field(default_factory=list)
+    # Seconds the learner needed for each card in the order of the deck
+    # (only a QuizSession measures them; NaN for a card never shown)
+    response_times: Sequence[float] = field(default_factory=list)
 
-def run_quiz_round(deck: List[Card], answers: List[str]) -> Result:
+@metrics.timed("run_quiz_round")
+def run_quiz_round(deck: Sequence[Card], answers: List[str], index: Optional[AnswerIndex] = None) -> Result:
     """
     The function checks each answer of user during the quiz round.
     It creates a list of tuples from two lists - the deck of Cards and user's answers,
@@ -68,18 +276,569 @@ def run_quiz_round(deck: List[Card], answers: List[str]) -> Result:
     correct answers, and creates a list of Cards with wrong answers to give the user
     the possibility to only work on those ones further after the round finishes.
 
-    The function accepts a deck - a list of Cards, and the answers - list of user's answers.
-    It creates and returns the oblect of a class Result.
+    The function accepts a deck - a Deck or a list of Cards, and the answers - list of user's answers.
+    It creates and returns the oblect of a class Result. For a Deck the wrong
+    cards are a view of the same deck.
+
+    With the AnswerIndex of the deck the answers are matched with tolerance
+    to typos and the near misses are listed in Result.near_miss_cards.
+    """
+    if index is not None:
+        near_is_correct = index.config.near_miss_is_correct
+        correct = 0
+        wrong, near = [], []
+        for i, (card, user) in enumerate(zip(deck, answers)):
+            grade = index.grade(user, card.answer)
+            if grade == NEAR:
+                near.append(i)
+            if grade == EXACT or (grade == NEAR and near_is_correct):
+                correct += 1
+            else:
+                wrong.append(i)
+        return Result(total=len(deck), correct=correct, wrong_cards=_pick(deck, wrong), near_miss_cards=_pick(deck, near))
+    marks = grade_batch(deck, answers)
+    wrong = [i for i, ok in enumerate(marks) if not ok]
+    return Result(total=len(deck), correct=sum(marks), wrong_cards=_pick(deck, wrong))
+
+
+def grade_batch(deck: Sequence[Card], answers: List[str]) -> List[bool]:
+    """
+    The function grades the answers to the cards of the deck (the same
+    order, like in run_quiz_round) and returns a list of True/False.
+    The answers of the cards are normalized only once and kept on the cards
+    (or in the shared column of a Deck).
+    """
+    return [normalize(user) == key for key, user in zip(_normalized_answers(deck), answers)]
+
+
+def _grade_columns(keys: List[str], columns: List[List[str]]) -> List[List[bool]]:
+    """
+    Grade the answer columns against the normalized answers of the cards.
+    It is a top-level function so the worker processes can run it.
+    """
+    return [[normalize(user) == key for key, user in zip(keys, column)] for column in columns]
+
+
+@dataclass
+class BatchResult:
+    per_column: List[Result]    # One Result for each column of answers (one learner)
+    per_card: List[Result]      # One Result for each card of the deck, over all columns
+    total: Result               # The sum over all cards and columns
+
+
+def grade_columns(deck: Sequence[Card], columns: List[List[str]], workers: Optional[int] = None,
+                  chunk_size: int = 256) -> BatchResult:
+    """
+    The function grades many columns of answers to the same deck at once,
+    for example the answer sheets of all learners of a class.
+
+    Each column is a list of answers in the order of the deck. The answers
+    of the cards are normalized once for all columns. When workers is more
+    than 1, the columns are graded in a pool of processes by chunks of
+    chunk_size columns, which pays off for hundreds of thousands of answers.
+
+    Returns the BatchResult with the Result of each column, of each card
+    (how many columns answered it correctly) and the total one.
+    """
+    keys = _normalized_answers(deck)
+    if workers and workers > 1 and len(columns) > chunk_size:
+        from concurrent.futures import ProcessPoolExecutor  # Slow to import, needed only here
+
+        chunks = [columns[i:i + chunk_size] for i in range(0, len(columns), chunk_size)]
+        with ProcessPoolExecutor(workers) as pool:
+            marks = [m for part in pool.map(_grade_columns, itertools.repeat(keys), chunks) for m in part]
+    else:
+        marks = _grade_columns(keys, columns)
+
+    per_column = []
+    card_correct = [0] * len(deck)
+    for column_marks in marks:
+        wrong = []
+        for i, ok in enumerate(column_marks):
+            if ok:
+                card_correct[i] += 1
+            else:
+                wrong.append(i)
+        per_column.append(Result(total=len(column_marks), correct=len(column_marks) - len(wrong), wrong_cards=_pick(deck, wrong)))
+
+    per_card = [
+        Result(total=len(columns), correct=k, wrong_cards=_pick(deck, [i] if k < len(columns) else []))
+        for i, k in enumerate(card_correct)
+    ]
+    total = Result(
+        total=sum(r.total for r in per_column),
+        correct=sum(card_correct),
+        wrong_cards=_pick(deck, [i for i, k in enumerate(card_correct) if k < len(columns)]),
+    )
+    return BatchResult(per_column=per_column, per_card=per_card, total=total)
+
+
+class QuizSession:
+    """
+    The state of one quiz round, independent of any user interface.
+
+    The session goes through the deck card by card: current() returns the
+    card to show, submit() grades the answer at once and skip() gives up
+    the card. Only the position, the number of correct answers and the
+    positions of the wrong and near-miss cards are kept, so a session
+    costs a few small objects besides the (shared) deck.
+
+    The time from the first current() call for a card to its submit() or
+    skip() is its response time; they are kept in an array of doubles and
+    reported in the Result (and to the card_response_seconds histogram).
+    """
+    __slots__ = ("deck", "index", "idx", "correct", "_wrong", "_near", "_times", "_shown_at")
+
+    def __init__(self, deck: Sequence[Card], index: Optional[AnswerIndex] = None):
+        self.deck = deck
+        self.index = index
+        self.idx = 0
+        self.correct = 0
+        self._wrong = array("I")
+        self._near = array("I")
+        self._times = array("d")
+        self._shown_at = None
+
+    @property
+    def done(self) -> bool:
+        return self.idx >= len(self.deck)
+
+    def current(self) -> Optional[Card]:
+        """
+        Return the card to answer now, or None if the round is over.
+        """
+        if self.done:
+            return None
+        if self._shown_at is None:
+            self._shown_at = time.monotonic()
+        return self.deck[self.idx]
+
+    def _record_time(self) -> None:
+        if self._shown_at is None:
+            self._times.append(float("nan"))
+        else:
+            seconds = time.monotonic() - self._shown_at
+            self._times.append(seconds)
+            metrics.observe("card_response_seconds", seconds)
+            self._shown_at = None
+
+    def submit(self, answer: str) -> str:
+        """
+        Grade the answer to the current card, move to the next card and
+        return the grade: EXACT, NEAR or WRONG.
+        """
+        card = self.deck[self.idx]
+        return self._grade(grade_answer(answer, card, self.index))
+
+    def submit_choice(self, option: str) -> str:
+        """
+        Grade the option chosen in the multiple-choice mode (only the answer
+        of the card itself is EXACT, there are no near misses), move to the
+        next card and return the grade.
+        """
+        return self._grade(EXACT if option == self.deck[self.idx].answer else WRONG)
+
+    def _grade(self, grade: str) -> str:
+        if grade == NEAR:
+            self._near.append(self.idx)
+        if grade == EXACT or (grade == NEAR and self.index.config.near_miss_is_correct):
+            self.correct += 1
+        else:
+            self._wrong.append(self.idx)
+        self._record_time()
+        self.idx += 1
+        return grade
+
+    def skip(self) -> Card:
+        """
+        Skip the current card (it counts as a wrong answer) and return it.
+        """
+        card = self.deck[self.idx]
+        self._wrong.append(self.idx)
+        self._record_time()
+        self.idx += 1
+        return card
+
+    def replay(self, grade: str) -> None:
+        """
+        Apply a grade saved earlier (EXACT, NEAR, WRONG or SKIPPED) to the
+        current card without grading again, to restore a session from its journal.
+        """
+        if grade == SKIPPED:
+            self.skip()
+        else:
+            self._grade(grade)
+
+    def finish(self) -> Result:
+        """
+        Return the Result of the answered cards.
+        """
+        return Result(
+            total=len(self.deck),
+            correct=self.correct,
+            wrong_cards=_pick(self.deck, list(self._wrong)),
+            near_miss_cards=_pick(self.deck, list(self._near)),
+            response_times=self._times.tolist(),
+        )
+
+    def response_times(self) -> List[Tuple[str, float]]:
+        """
+        Return (prompt, seconds) of every answered card.
+        """
+        return [(self.deck[i].prompt, seconds) for i, seconds in enumerate(self._times)]
+
+
+class AsyncQuizEngine:
+    """
+    Many quiz sessions in one process with an asyncio interface.
+
+    The decks of the topics are registered once; each session gets only
+    its own shuffled order of the shared deck and its counters, so
+    thousands of sessions fit in a small amount of memory. The methods
+    are coroutines, so the engine can be used directly from an asyncio
+    server; every call is short and never blocks the event loop.
+    """
+
+    def __init__(self):
+        self.decks: Dict[str, Deck] = {}
+        self.indexes: Dict[str, AnswerIndex] = {}
+        self.sessions: Dict[int, QuizSession] = {}
+        self._ids = itertools.count(1)
+
+    def register_topic(self, name: str, topic_dict: Dict[str, str], fuzzy: bool = True) -> None:
+        """
+        Register the deck of a topic (for example "IT/English to Ukranian").
+        """
+        deck = Deck.from_dict(topic_dict)
+        self.decks[name] = deck
+        if fuzzy:
+            self.indexes[name] = AnswerIndex(deck._columns.answers)
+
+    async def start(self, name: str) -> int:
+        """
+        Start a new session with the shuffled deck of the topic and return its id.
+        """
+        session_id = next(self._ids)
+        self.sessions[session_id] = QuizSession(self.decks[name].shuffled(), self.indexes.get(name))
+        return session_id
+
+    async def next_card(self, session_id: int) -> Optional[Card]:
+        """
+        Return the card to answer or None if the round is over.
+        """
+        return self.sessions[session_id].current()
+
+    async def submit(self, session_id: int, answer: str) -> str:
+        """
+        Grade the answer to the current card of the session.
+        """
+        return self.sessions[session_id].submit(answer)
+
+    async def skip(self, session_id: int) -> Card:
+        """
+        Skip the current card of the session.
+        """
+        return self.sessions[session_id].skip()
+
+    async def finish(self, session_id: int) -> Result:
+        """
+        Finish the session, forget it and return its Result.
+        """
+        return self.sessions.pop(session_id).finish()
+
+
+DAY = 24 * 60 * 60  # Seconds in a day
+
+CardKey = Tuple[str, str, str]  # (topic, prompt, direction)
+
+
+def card_key(topic: str, prompt: str, direction: str) -> CardKey:
+    """
+    The function returns the key of a card for the Scheduler.
+    """
+    return (topic, prompt, direction)
+
+
+@dataclass
+class CardState:
+    ease: float = 2.5       # How fast the interval grows
+    interval: float = 0.0   # Days until the next review
+    reps: int = 0           # Correct reviews in a row
+    due: float = 0.0        # Timestamp of the next review
+
+
+class Scheduler:
+    """
+    The class schedules the reviews of cards with the SM-2 algorithm.
+
+    It keeps the CardState of every practiced card and an indexed priority
+    queue (a heap of [due, order, key] entries plus a dictionary key -> entry)
+    of their due times. When the due time of a card changes, its old entry
+    is only marked as removed, so every update costs O(log n) and the
+    next k due cards across all topics are found in O(k log n).
     """
-    correct = 0
-    wrong = []
-    for card, user in zip(deck, answers):
-        if check_answer(user, card):
-            correct += 1
+
+    def __init__(self):
+        self.states: Dict[CardKey, CardState] = {}
+        self._heap: List[list] = []
+        self._entries: Dict[CardKey, list] = {}
+        self._order = itertools.count()  # Keeps the heap stable for equal due times
+
+    def _push(self, key: CardKey, due: float) -> None:
+        old = self._entries.pop(key, None)
+        if old is not None:
+            old[2] = None  # Mark as removed
+        entry = [due, next(self._order), key]
+        self._entries[key] = entry
+        heapq.heappush(self._heap, entry)
+        # Rebuild the heap when most of it are removed entries
+        if len(self._heap) > 2 * len(self._entries) + 64:
+            self._heap = list(self._entries.values())
+            heapq.heapify(self._heap)
+
+    def review(self, key: CardKey, quality: int, now: Optional[float] = None) -> CardState:
+        """
+        Update the state of the card after a review and return it.
+        quality is the SM-2 grade from 0 (forgot) to 5 (perfect).
+        """
+        now = time.time() if now is None else now
+        state = self.states.get(key)
+        if state is None:
+            state = self.states[key] = CardState()
+        if quality < 3:
+            # Like in SM-2, a failed card starts again, but keeps its ease
+            state.reps = 0
+            state.interval = 1.0
         else:
-            wrong.append(card)
-        
-    return Result(total=len(deck), correct=correct, wrong_cards=wrong)
+            state.reps += 1
+            if state.reps == 1:
+                state.interval = 1.0
+            elif state.reps == 2:
+                state.interval = 6.0
+            else:
+                state.interval = state.interval * state.ease
+            state.ease = max(1.3, state.ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+        state.due = now + state.interval * DAY
+        self._push(key, state.due)
+        return state
+
+    def record_round(self, topic: str, direction: str, deck: Sequence[Card], res: "Result",
+                     now: Optional[float] = None) -> None:
+        """
+        Review every card of the finished round: the wrong cards get
+        the grade 1 and the correct ones the grade 4.
+        """
+        # The prompts are unique in a topic and direction, so they identify the cards
+        wrong = {card.prompt for card in res.wrong_cards}
+        for card in deck:
+            quality = 1 if card.prompt in wrong else 4
+            self.review(card_key(topic, card.prompt, direction), quality, now)
+
+    def due_cards(self, n: int, now: Optional[float] = None) -> List[CardKey]:
+        """
+        Return the keys of at most n cards which are due, the most overdue first.
+        """
+        now = time.time() if now is None else now
+        taken = []
+        while self._heap and len(taken) < n:
+            entry = self._heap[0]
+            if entry[2] is None:
+                heapq.heappop(self._heap)
+                continue
+            if entry[0] > now:
+                break
+            taken.append(heapq.heappop(self._heap))
+        for entry in taken:
+            heapq.heappush(self._heap, entry)
+        return [entry[2] for entry in taken]
+
+    def to_rows(self) -> List[list]:
+        """
+        Return the states as a list of rows [topic, prompt, direction, ease, interval, reps, due].
+        """
+        return [[*key, st.ease, st.interval, st.reps, st.due] for key, st in self.states.items()]
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[list]) -> "Scheduler":
+        """
+        Create the Scheduler from the rows made by to_rows().
+        """
+        scheduler = cls()
+        for topic, prompt, direction, ease, interval, reps, due in rows:
+            key = card_key(topic, prompt, direction)
+            scheduler.states[key] = CardState(ease, interval, reps, due)
+            entry = [due, next(scheduler._order), key]
+            scheduler._entries[key] = entry
+            scheduler._heap.append(entry)
+        heapq.heapify(scheduler._heap)
+        return scheduler
+
+
+class AliasTable:
+    """
+    Walker's alias table: after O(n) preparation every weighted random
+    choice of an index costs O(1), one random number and one comparison.
+    """
+    __slots__ = ("prob", "alias")
+
+    def __init__(self, weights: Sequence[float]):
+        n = len(weights)
+        total = float(sum(weights))
+        self.prob = array("d", bytes(8 * n))
+        self.alias = array("I", bytes(4 * n))
+        if n == 0 or total <= 0:
+            return
+        scaled = [w * n / total for w in weights]
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s, l = small.pop(), large[-1]
+            self.prob[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] -= 1.0 - scaled[s]
+            if scaled[l] < 1.0:
+                small.append(large.pop())
+        for i in small + large:  # Only rounding errors are left, they are 1.0
+            self.prob[i] = 1.0
+
+    def sample(self, rnd: random.Random = random) -> int:
+        r = rnd.random() * len(self.prob)
+        i = int(r)
+        return i if r - i < self.prob[i] else self.alias[i]
+
+
+def _keyed_order(weights: Sequence[float], indexes: List[int], k: int, rnd: random.Random) -> List[int]:
+    """
+    Return the k first of the indexes ordered by the random keys
+    u ** (1 / weight) (Efraimidis-Spirakis), the weighted random order.
+    """
+    random_ = rnd.random
+    keys = {i: (random_() ** (1.0 / weights[i]) if weights[i] > 0 else 0.0) for i in indexes}
+    if k < len(indexes):
+        return heapq.nlargest(k, indexes, key=keys.__getitem__)
+    return sorted(indexes, key=keys.__getitem__, reverse=True)
+
+
+def weighted_sample(weights: Sequence[float], k: Optional[int] = None, rnd: random.Random = random) -> List[int]:
+    """
+    Return k different indexes (all of them if k is None) in a random
+    order where an index with a bigger weight tends to come earlier.
+
+    For a small k the indexes are drawn from an AliasTable and the repeated
+    ones are rejected, so the sample costs O(n + k) instead of sorting
+    the whole deck. When the rejections become frequent (most of the weight
+    is already taken), and for the samples of more than half of the deck,
+    the indexes are ordered by the random keys u ** (1 / weight) instead,
+    which gives the same distribution.
+    """
+    n = len(weights)
+    k = n if k is None else min(k, n)
+    if 2 * k >= n:
+        return _keyed_order(weights, list(range(n)), k, rnd)
+    table = AliasTable(weights)
+    chosen, taken = [], set()
+    rejected = 0
+    while len(chosen) < k and rejected <= len(chosen) + 8:
+        i = table.sample(rnd)
+        if i in taken:
+            rejected += 1
+            continue
+        taken.add(i)
+        chosen.append(i)
+    if len(chosen) < k:
+        rest = [i for i in range(n) if i not in taken]
+        chosen.extend(_keyed_order(weights, rest, k - len(chosen), rnd))
+    return chosen
+
+
+class CardStats:
+    """
+    The attempts, misses and last time seen of every practiced card,
+    keyed like the Scheduler by (topic, prompt, direction).
+
+    The numbers are kept in three arrays (one row per card) and a dictionary
+    key -> row, so a card costs a few bytes besides its key, and the whole
+    index is saved as the arrays' bytes (see results_store.save_card_stats).
+    """
+
+    def __init__(self):
+        self.rows: Dict[CardKey, int] = {}
+        self.keys: List[CardKey] = []
+        self.attempts = array("I")
+        self.misses = array("I")
+        self.last_seen = array("d")
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def record(self, key: CardKey, missed: bool, now: Optional[float] = None) -> None:
+        """
+        Count one attempt of the card.
+        """
+        row = self.rows.get(key)
+        if row is None:
+            row = self.rows[key] = len(self.keys)
+            self.keys.append(key)
+            self.attempts.append(0)
+            self.misses.append(0)
+            self.last_seen.append(0.0)
+        self.attempts[row] += 1
+        self.misses[row] += missed
+        self.last_seen[row] = time.time() if now is None else now
+
+    def record_round(self, topic: str, direction: str, deck: Sequence[Card], res: "Result",
+                     now: Optional[float] = None) -> None:
+        """
+        Count the attempts of every card of the finished round and the misses of the wrong ones.
+        """
+        now = time.time() if now is None else now
+        wrong = {card.prompt for card in res.wrong_cards}
+        for card in deck:
+            self.record(card_key(topic, card.prompt, direction), card.prompt in wrong, now)
+
+    def get(self, key: CardKey) -> Optional[Tuple[int, int, float]]:
+        """
+        Return (attempts, misses, last_seen) of the card or None if it was never practiced.
+        """
+        row = self.rows.get(key)
+        if row is None:
+            return None
+        return self.attempts[row], self.misses[row], self.last_seen[row]
+
+    def difficulty(self, key: CardKey) -> float:
+        """
+        Return the share of misses smoothed towards 1/2, so a new card
+        is 0.5, a card missed every time goes to 1 and a well known card to 0.
+        """
+        row = self.rows.get(key)
+        if row is None:
+            return 0.5
+        return (self.misses[row] + 1) / (self.attempts[row] + 2)
+
+    def weights(self, topic: str, direction: str, prompts: Iterable[str]) -> List[float]:
+        """
+        Return the sampling weights of the cards of the topic for make_deck().
+        """
+        return [self.difficulty(card_key(topic, prompt, direction)) for prompt in prompts]
 
+    def to_payload(self) -> tuple:
+        """
+        Return the index as (keys, attempts bytes, misses bytes, last_seen bytes).
+        """
+        return (self.keys, self.attempts.tobytes(), self.misses.tobytes(), self.last_seen.tobytes())
 
-    
\ No newline at end of file
+    @classmethod
+    def from_payload(cls, payload: tuple) -> "CardStats":
+        """
+        Create the CardStats from the payload made by to_payload().
+        """
+        keys, attempts, misses, last_seen = payload
+        stats = cls()
+        stats.keys = [tuple(key) for key in keys]
+        stats.rows = {key: row for row, key in enumerate(stats.keys)}
+        stats.attempts.frombytes(attempts)
+        stats.misses.frombytes(misses)
+        stats.last_seen.frombytes(last_seen)
+        if not (len(stats.keys) == len(stats.attempts) == len(stats.misses) == len(stats.last_seen)):
+            raise ValueError("broken card stats")
+        return stats
@@ -0,0 +1,75 @@
+# Description: Tests of the typo-tolerant answer matching of answer_matching.py.
+
+import random
+
+import pytest
+
+from answer_matching import EXACT, NEAR, WRONG, AnswerIndex, MatchConfig, bounded_distance, split_answers
+
+
+def osa_distance(a, b, transpositions=True):
+    """
+    The full-matrix optimal string alignment distance, the reference for
+    bounded_distance().
+    """
+    d = [[0] * (len(b) + 1) for _ in range(len(a) + 1)]
+    for i in range(len(a) + 1):
+        d[i][0] = i
+    for j in range(len(b) + 1):
+        d[0][j] = j
+    for i in range(1, len(a) + 1):
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            d[i][j] = min(d[i - 1][j] + 1, d[i][j - 1] + 1, d[i - 1][j - 1] + cost)
+            if transpositions and i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                d[i][j] = min(d[i][j], d[i - 2][j - 2] + 1)
+    return d[len(a)][len(b)]
+
+
+@pytest.mark.parametrize("transpositions", [True, False])
+def test_bounded_distance_agrees_with_the_reference(transpositions):
+    rnd = random.Random(0)
+    for _ in range(5000):
+        a = "".join(rnd.choice("abc") for _ in range(rnd.randint(0, 7)))
+        b = "".join(rnd.choice("abc") for _ in range(rnd.randint(0, 7)))
+        limit = rnd.randint(0, 3)
+        expected = osa_distance(a, b, transpositions)
+        assert bounded_distance(a, b, limit, transpositions) == (expected if expected <= limit else limit + 1), (a, b, limit)
+
+
+def test_bounded_distance_examples():
+    assert bounded_distance("interface", "interfase", 2) == 1
+    assert bounded_distance("form", "from", 2) == 1
+    assert bounded_distance("form", "from", 2, transpositions=False) == 2
+    assert bounded_distance("ca", "abc", 2) == 3  # OSA, not the unrestricted Damerau distance
+    assert bounded_distance("short", "much longer", 2) == 3
+
+
+def test_split_answers():
+    assert split_answers("макет|план") == ("макет", "план")
+    assert split_answers(" макет | план |") == ("макет", "план")
+    assert split_answers("TCP/IP") == ("TCP/IP",)
+    assert split_answers("I/O; input") == ("I/O; input",)
+
+
+def test_grade():
+    index = AnswerIndex()
+    assert index.grade("Interface", "interface") == EXACT
+    assert index.grade("  hello   world ", "Hello World") == EXACT
+    assert index.grade("interfase", "interface") == NEAR
+    assert index.grade("інтерфейс", "інтерфейс") == EXACT
+    assert index.grade("пам’ять", "пам'ять") == EXACT  # Another apostrophe
+    assert index.grade("план", "макет|план") == EXACT
+    assert index.grade("", "interface") == WRONG
+    assert index.grade("cat", "car") == WRONG  # Short answers must be exact
+    assert index.grade("I", "I/O") == WRONG
+    assert index.grade("TCP", "TCP/IP") == WRONG
+    assert index.grade("tcp/ip", "TCP/IP") == EXACT
+
+
+def test_grade_uses_the_config():
+    strict = AnswerIndex(config=MatchConfig(max_distance=0))
+    assert strict.grade("interfase", "interface") == WRONG
+    no_swaps = AnswerIndex(config=MatchConfig(transpositions=False, chars_per_typo=10))
+    assert no_swaps.grade("intreface", "interface") == WRONG
+    assert AnswerIndex().grade("intreface", "interface") == NEAR
@@ -0,0 +1,87 @@
+# Description: Tests of the TkWorker of background.py with a fake widget
+# instead of a Tk window, so they run without a display.
+
+import time
+
+from background import TkWorker
+
+
+class FakeWidget:
+    """
+    Keeps the callbacks of after() and runs them on run_pending(),
+    like the Tk main loop would.
+    """
+
+    def __init__(self):
+        self.scheduled = []
+
+    def after(self, ms, callback):
+        self.scheduled.append(callback)
+
+    def run_pending(self):
+        callbacks, self.scheduled = self.scheduled, []
+        errors = []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as exc:  # Tk reports the callback errors and goes on
+                errors.append(exc)
+        return errors
+
+
+def drain(widget, worker, timeout=2.0):
+    """
+    Run the main loop until the worker has no pending jobs.
+    """
+    errors = []
+    deadline = time.monotonic() + timeout
+    while worker._pending and time.monotonic() < deadline:
+        errors.extend(widget.run_pending())
+        time.sleep(0.005)
+    return errors
+
+
+def failing_job():
+    raise OSError("results/ is read-only")
+
+
+def test_results_are_delivered_after_a_failed_job():
+    widget = FakeWidget()
+    worker = TkWorker(widget, poll_ms=1)
+    done = []
+    worker.submit(failing_job)
+    worker.submit(lambda: 1, on_done=done.append)
+    errors = drain(widget, worker)
+    # The error is still raised in the main loop
+    assert len(errors) == 1 and isinstance(errors[0], OSError)
+    worker.submit(lambda: 2, on_done=done.append)
+    drain(widget, worker)
+    assert done == [1, 2]
+    assert worker._pending == 0
+    worker.shutdown(1)
+
+
+def test_results_are_delivered_after_a_failed_callback():
+    widget = FakeWidget()
+    worker = TkWorker(widget, poll_ms=1)
+    done = []
+
+    def broken(value):
+        raise ValueError(value)
+
+    worker.submit(lambda: 1, on_done=broken)
+    worker.submit(lambda: 2, on_done=done.append)
+    errors = drain(widget, worker)
+    assert [type(exc) for exc in errors] == [ValueError]
+    assert done == [2]
+    worker.shutdown(1)
+
+
+def test_on_error_gets_the_exception():
+    widget = FakeWidget()
+    worker = TkWorker(widget, poll_ms=1)
+    failed = []
+    worker.submit(failing_job, on_error=failed.append)
+    assert drain(widget, worker) == []
+    assert len(failed) == 1 and isinstance(failed[0], OSError)
+    worker.shutdown(1)
@@ -0,0 +1,36 @@
+# Description: Tests of the .wcd deck files of deck_format.py.
+
+from deck_format import DeckFile, import_csv
+
+
+def write_csv(path, text):
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def test_one_row_with_an_empty_cell(tmp_path):
+    csv_file = write_csv(tmp_path / "words.csv", "topic,en,uk,de\nA/B,cat,кіт,\n")
+    import_csv(csv_file, str(tmp_path / "words.wcd"))
+    deck = DeckFile.open(str(tmp_path / "words.wcd"))
+    assert deck.words("A", "en", "uk") == {"cat": "кіт"}
+    assert deck.words("A", "en", "de") == {}
+    assert deck.column("de") == [""]
+
+
+def test_round_trip_keeps_topics_and_cells(tmp_path):
+    csv_file = write_csv(tmp_path / "words.csv",
+                         "topic,en,uk\nAnimals/Pets,cat,кіт\nAnimals/Farm,cow,корова\nIT,file,файл|документ\n")
+    import_csv(csv_file, str(tmp_path / "words.wcd"))
+    deck = DeckFile.open(str(tmp_path / "words.wcd"))
+    assert "Animals" in deck and "Animals/Pets" in deck
+    assert deck.english_to_ukranian("Animals") == {"cat": "кіт", "cow": "корова"}
+    assert deck.ukranian_to_english("IT") == {"файл": "file"}
+    assert deck.english_to_ukranian("IT") == {"file": "файл|документ"}
+
+
+def test_empty_deck(tmp_path):
+    csv_file = write_csv(tmp_path / "words.csv", "topic,en,uk\n")
+    import_csv(csv_file, str(tmp_path / "words.wcd"))
+    deck = DeckFile.open(str(tmp_path / "words.wcd"))
+    assert len(deck) == 0
+    assert deck.column("en") == []
@@ -0,0 +1,41 @@
+# Description: Tests of the cohort report of report.py over temporary
+# results files.
+
+import json
+
+from report import summarize_file
+
+
+def write_log(path, entries):
+    with open(path, "w", encoding="utf-8") as f:
+        for entry in entries:
+            f.write((entry if isinstance(entry, str) else json.dumps(entry, ensure_ascii=False)) + "\n")
+    return str(path)
+
+
+def test_a_bad_date_skips_only_its_entry(tmp_path):
+    log = write_log(tmp_path / "history.jsonl", [
+        {"topic": "IT", "date": "2026-10-15T10:00:00", "correct": 8, "total": 10, "wrong": ["file"]},
+        {"topic": "IT", "date": "2026-10-16T10:00:00", "correct": 9, "total": 10},
+        {"topic": "IT", "date": "bad", "correct": 1, "total": 10},
+        "not json",
+        {"topic": "IT", "date": "2026-10-17T09:00:00", "correct": 10, "total": 10, "retry": True},
+    ])
+    partial = summarize_file(("learner", log, "2026-10-17", False))
+    row = partial["learner"]
+    assert (row["rounds"], row["correct"], row["total"]) == (2, 17, 20)
+    assert row["last_date"] == "2026-10-17"  # The work on mistakes is practice too
+    assert (row["longest_streak_days"], row["current_streak_days"]) == (3, 3)
+    assert partial["topics"] == {"IT": [2, 17, 20]}
+    assert partial["words"] == {("IT", "", "file"): 1}
+
+
+def test_streak_is_broken_by_a_missed_day(tmp_path):
+    log = write_log(tmp_path / "history.jsonl", [
+        {"topic": "IT", "date": "2026-10-10", "correct": 1, "total": 1},
+        {"topic": "IT", "date": "2026-10-11", "correct": 1, "total": 1},
+        {"topic": "IT", "date": "2026-10-14", "correct": 1, "total": 1},
+    ])
+    row = summarize_file(("learner", log, "2026-10-17", False))["learner"]
+    assert (row["longest_streak_days"], row["current_streak_days"]) == (2, 0)
+    assert row["last_date"] == "2026-10-14"
@@ -0,0 +1,76 @@
+# Description: Tests of the SM-2 Scheduler of services_quiz_engine.py and
+# its priority queue of due cards.
+
+import pytest
+
+from services_quiz_engine import DAY, Card, Deck, Result, Scheduler, card_key, make_deck
+
+
+def key(prompt, topic="IT"):
+    return card_key(topic, prompt, "English to Ukranian")
+
+
+def test_intervals_and_ease_follow_sm2():
+    scheduler = Scheduler()
+    state = scheduler.review(key("file"), 4, now=0)
+    assert (state.reps, state.interval, state.ease) == (1, 1.0, 2.5)
+    state = scheduler.review(key("file"), 5, now=DAY)
+    assert (state.reps, state.interval) == (2, 6.0)
+    assert state.ease == pytest.approx(2.6)
+    state = scheduler.review(key("file"), 3, now=7 * DAY)
+    assert state.interval == pytest.approx(6.0 * 2.6)
+    assert state.ease == pytest.approx(2.6 - 0.14)
+    assert state.due == pytest.approx(7 * DAY + state.interval * DAY)
+
+
+def test_failed_review_resets_the_card_but_keeps_the_ease():
+    scheduler = Scheduler()
+    scheduler.review(key("file"), 5, now=0)
+    ease = scheduler.states[key("file")].ease
+    state = scheduler.review(key("file"), 1, now=DAY)
+    assert (state.reps, state.interval, state.ease) == (0, 1.0, ease)
+
+
+def test_due_cards_most_overdue_first_across_topics():
+    scheduler = Scheduler()
+    scheduler.review(key("a", "IT"), 4, now=0)          # Due at 1 day
+    scheduler.review(key("b", "Travel"), 4, now=-DAY)   # Due at 0
+    scheduler.review(key("c", "IT"), 4, now=5 * DAY)    # Not due yet
+    assert scheduler.due_cards(10, now=2 * DAY) == [key("b", "Travel"), key("a", "IT")]
+    assert scheduler.due_cards(1, now=2 * DAY) == [key("b", "Travel")]
+    # A new review moves the card in the queue and the old entry is ignored
+    scheduler.review(key("b", "Travel"), 4, now=2 * DAY)
+    assert scheduler.due_cards(10, now=2 * DAY) == [key("a", "IT")]
+    # due_cards() does not take the cards out of the queue
+    assert scheduler.due_cards(10, now=2 * DAY) == [key("a", "IT")]
+
+
+def test_many_updates_keep_the_queue_small():
+    scheduler = Scheduler()
+    for i in range(1000):
+        scheduler.review(key(str(i % 10)), 1, now=i)
+    assert len(scheduler._heap) <= 2 * len(scheduler.states) + 64
+    assert len(scheduler.due_cards(100, now=10 ** 9)) == 10
+
+
+def test_rows_round_trip():
+    scheduler = Scheduler()
+    scheduler.review(key("a"), 4, now=0)
+    scheduler.review(key("b"), 1, now=DAY)
+    restored = Scheduler.from_rows(scheduler.to_rows())
+    assert restored.states == scheduler.states
+    assert restored.due_cards(10, now=10 * DAY) == scheduler.due_cards(10, now=10 * DAY)
+
+
+def test_record_round_and_due_deck():
+    scheduler = Scheduler()
+    deck = Deck(["a", "b", "c"], ["а", "б", "в"])
+    res = Result(total=3, correct=2, wrong_cards=[Card("b", "б")])
+    scheduler.record_round("IT", "English to Ukranian", deck, res, now=0)
+    assert scheduler.states[key("b")].reps == 0
+    assert scheduler.states[key("a")].reps == 1
+    words = {"a": "а", "b": "б", "c": "в", "d": "г"}
+    due = make_deck(words, mode="due", scheduler=scheduler, topic="IT", direction="English to Ukranian", now=DAY)
+    assert sorted(due.prompts()) == ["a", "b", "c", "d"]
+    due = make_deck(words, mode="due", scheduler=scheduler, topic="IT", direction="English to Ukranian", now=0)
+    assert due.prompts() == ["d"]  # Only the never practiced card
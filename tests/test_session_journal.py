@@ -0,0 +1,106 @@
+# Description: Tests of the SessionJournal of results_store.py and of
+# QuizSession.replay(), which restores a session from it.
+
+import json
+import os
+
+import pytest
+
+from answer_matching import EXACT, NEAR, WRONG, AnswerIndex
+from results_store import SessionJournal
+from services_quiz_engine import SKIPPED, Deck, QuizSession
+
+
+@pytest.fixture
+def deck():
+    return Deck(["cat", "dog", "cow", "hen"], ["кіт", "пес", "корова", "курка"])
+
+
+@pytest.fixture
+def journal(tmp_path):
+    journal = SessionJournal(str(tmp_path / "results" / "session.jsonl"))
+    yield journal
+    journal.close()
+
+
+def test_start_and_record(journal, deck):
+    journal.start("Animals", "English to Ukranian", deck, retry=True, multiple_choice=True)
+    journal.record(0, EXACT)
+    journal.record(1, SKIPPED)
+    state = journal.load()
+    assert (state["topic"], state["direction"], state["retry"], state["multiple_choice"]) == (
+        "Animals", "English to Ukranian", True, True)
+    assert state["prompts"] == ["cat", "dog", "cow", "hen"]
+    assert state["answers"] == ["кіт", "пес", "корова", "курка"]
+    assert state["grades"] == [EXACT, SKIPPED]
+
+
+def test_missing_or_broken_journal(journal):
+    assert journal.load() is None
+    os.makedirs(os.path.dirname(journal.path))
+    with open(journal.path, "w", encoding="utf-8") as f:
+        f.write("not json\n")
+    assert journal.load() is None
+
+
+def test_torn_last_line_is_cut_off_and_appended_after(journal, deck):
+    journal.start("Animals", "English to Ukranian", deck)
+    journal.record(0, EXACT)
+    journal.close()
+    with open(journal.path, "ab") as f:
+        f.write(b'{"i":1,"g"')  # The crash was in the middle of a record
+    state = journal.load()
+    assert state["grades"] == [EXACT]
+    journal.reopen(state["size"])
+    journal.record(1, WRONG)
+    journal.close()
+    assert journal.load()["grades"] == [EXACT, WRONG]
+    with open(journal.path, "rb") as f:
+        for line in f.read().splitlines():
+            json.loads(line)  # Nothing of the torn line is left
+
+
+def test_out_of_order_records_are_ignored(journal, deck):
+    journal.start("Animals", "English to Ukranian", deck)
+    journal.record(0, EXACT)
+    journal.record(2, WRONG)
+    journal.record(1, WRONG)
+    state = journal.load()
+    assert state["grades"] == [EXACT]
+    with open(journal.path, "rb") as f:
+        header, first = f.read().splitlines()[:2]
+    assert state["size"] == len(header) + len(first) + 2
+
+
+def test_fully_graded_journal_is_returned(journal, deck):
+    journal.start("Animals", "English to Ukranian", deck)
+    for i, grade in enumerate([EXACT, NEAR, WRONG, SKIPPED, EXACT]):  # One record too many
+        journal.record(i, grade)
+    state = journal.load()
+    assert state["grades"] == [EXACT, NEAR, WRONG, SKIPPED]
+    assert len(state["grades"]) == len(state["prompts"])
+
+
+def test_discard(journal, deck):
+    journal.start("Animals", "English to Ukranian", deck)
+    journal.discard()
+    assert journal.load() is None
+    journal.discard()  # Nothing to delete
+
+
+def test_replay_restores_the_session(deck):
+    index = AnswerIndex(card.answer for card in deck)
+    session = QuizSession(deck, index)
+    grades = [session.submit("кіт"), session.submit("кит"), session.submit("карова")]
+    assert grades == [EXACT, WRONG, NEAR]
+    restored = QuizSession(deck, index)
+    for grade in grades:
+        restored.replay(grade)
+    assert (restored.idx, restored.correct) == (session.idx, session.correct)
+    assert restored.current().prompt == "hen"
+    restored.replay(SKIPPED)
+    session.skip()
+    a, b = restored.finish(), session.finish()
+    assert (a.total, a.correct) == (b.total, b.correct) == (4, 2)
+    assert [card.prompt for card in a.wrong_cards] == [card.prompt for card in b.wrong_cards] == ["dog", "hen"]
+    assert [card.prompt for card in a.near_miss_cards] == [card.prompt for card in b.near_miss_cards] == ["cow"]
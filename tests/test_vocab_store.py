@@ -0,0 +1,98 @@
+# Description: Tests of the VocabStore of vocab_store.py against a temporary
+# SQLite file.
+
+import os
+
+import pytest
+
+from data_handler import TopicCatalog, get_topics_English_to_Ukranian, get_topics_Ukranian_to_English
+from vocab_store import VocabStore
+
+
+DATA_FILE = os.path.join(os.path.dirname(__file__), os.pardir, "data", "WordCards.csv")
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = VocabStore(str(tmp_path / "words.db"))
+    yield store
+    store.close()
+
+
+def test_import_dedupe_export_keeps_every_card(store, tmp_path):
+    report = store.import_csv(DATA_FILE)
+    assert report["inserted"] > 0
+    duplicates = store.duplicates()
+    assert ("Design", "макет", ["layout", "mockup"]) in [(t, u, sorted(e)) for t, u, e in duplicates]
+
+    # The duplicates are only reported, so the export reads back the same
+    out = str(tmp_path / "export.csv")
+    store.export_csv(out)
+    catalog = TopicCatalog(out)
+    catalog.scan()
+    e2u, u2e = get_topics_English_to_Ukranian(DATA_FILE), get_topics_Ukranian_to_English(DATA_FILE)
+    assert catalog.names() == sorted(e2u)
+    for topic in catalog.names():
+        assert dict(catalog.english_to_ukranian(topic)) == e2u[topic]
+        assert dict(catalog.ukranian_to_english(topic)) == u2e[topic]
+    assert catalog.english_to_ukranian("Design")["layout"] == "макет"
+    assert catalog.english_to_ukranian("Design")["mockup"] == "макет"
+
+
+def test_upsert_reports_inserted_updated_and_conflicts(store):
+    report = store.upsert([("cat", "кіт", "Animals"), ("dog", "пес", "Animals"), (" ", "x", "Animals")])
+    assert (report["inserted"], report["updated"], report["unchanged"]) == (2, 0, 0)
+    report = store.upsert([("cat", "кіт", "Animals"), ("dog", "собака", " Animals ")])
+    assert (report["inserted"], report["updated"], report["unchanged"]) == (0, 1, 1)
+    assert report["conflicts"] == [("Animals", "dog", "пес", "собака")]
+    assert store.english_to_ukranian("Animals") == {"cat": "кіт", "dog": "собака"}
+    assert store.ukranian_to_english("Animals") == {"кіт": "cat", "собака": "dog"}
+
+
+def test_failed_upsert_rolls_back_and_keeps_the_topic_cache(store):
+    def rows():
+        yield ("cat", "кіт", "NEW")
+        raise RuntimeError("broken batch")
+
+    with pytest.raises(RuntimeError):
+        store.upsert(rows())
+    assert "NEW" not in store
+    assert store.names() == []
+    store.upsert([("dog", "пес", "NEW")])
+    assert store.names() == ["NEW"]
+    assert store.english_to_ukranian("NEW") == {"dog": "пес"}
+    # Every word has its topic row
+    assert store.db.execute(
+        "SELECT count(*) FROM words WHERE topic_id NOT IN (SELECT id FROM topics)").fetchone() == (0,)
+
+
+def test_rename_topic_merges_into_an_existing_topic(store):
+    store.upsert([("cat", "кіт", "Pets"), ("dog", "пес", "Pets"), ("dog", "собака", "Animals"), ("cow", "корова", "Animals")])
+    conflicts = store.rename_topic("Pets", "Animals")
+    assert conflicts == [("dog", "пес", "собака")]
+    assert "Pets" not in store
+    assert store.names() == ["Animals"]
+    assert store.english_to_ukranian("Animals") == {"cow": "корова", "cat": "кіт", "dog": "пес"}
+
+
+def test_rename_topic_to_a_new_name(store):
+    store.upsert([("cat", "кіт", "Pets")])
+    assert store.rename_topic("Pets", "Animals") == []
+    assert store.names() == ["Animals"]
+    with pytest.raises(KeyError):
+        store.rename_topic("Pets", "Other")
+
+
+def test_delete_and_delete_topic(store):
+    store.upsert([("cat", "кіт", "Pets"), ("dog", "пес", "Pets"), ("cow", "корова", "Farm")])
+    assert store.delete([("cat", "Pets"), ("cat", "Unknown")]) == 1
+    assert store.delete_topic("Pets") == 1
+    assert "Pets" not in store
+    assert store.delete_topic("Pets") == 0
+    assert store.names() == ["Farm"]
+
+
+def test_duplicates_are_reported_without_changes(store):
+    store.upsert([("layout", "макет", "Design"), ("mockup", "макет", "Design"), ("font", "шрифт", "Design")])
+    assert [(t, u, sorted(e)) for t, u, e in store.duplicates()] == [("Design", "макет", ["layout", "mockup"])]
+    assert len(store.english_to_ukranian("Design")) == 3
@@ -3,22 +3,62 @@
 # 
 # Screens:
 #   - Home: select translation direction (EN→UA / UA→EN) and topic from CSV.
-#   - Quiz: shows flashcards with a prompt, input field, and buttons to check or skip.
+#   - Quiz: shows flashcards with a prompt, input field, and buttons to check or skip
+#     (or, in the multiple-choice mode, the answer and 3 similar wrong answers to pick from).
 #   - Result: displays percentage of correct answers and allows review of wrong cards.
 # 
 # Features:
 #   - Custom styling for Tkinter widgets (buttons, labels, entry fields, comboboxes).
 #   - Supports multiple topics loaded from a CSV file.
 #   - Tracks correct and incorrect answers and enables repeated practice for mistakes.
-
+#   - Disk I/O and deck preparation run in a background worker thread, so the
+#     window never waits for the disk; the deck of the chosen topic is prepared
+#     while the user is still on the Home screen.
+#   - Fast start: only Tkinter and the small background and deck_format
+#     modules are imported before the window is shown; the
+#     modules for the data, the results and the quiz are imported when they
+#     are first needed (mostly in the worker thread). Every screen is built
+#     once, the first time it is shown, together with its ttk styles, and
+#     later it is only hidden and shown again with new content.
+#   - The round in progress is journaled (see results_store.SessionJournal):
+#     every answer appends one short line to results/session.jsonl, so after
+#     a crash or closing the window in the middle of a round the app offers
+#     to resume it on the next launch.
+#   - With the WORDCARDS_PROBE environment variable set, the input-to-frame
+#     latency of the buttons is measured and printed on exit.
+#   - With the WORDCARDS_STARTUP environment variable set, the time to the
+#     first frame and the cost of every screen transition are printed on exit.
+#   - With the WORDCARDS_METRICS environment variable set (to a .json or .prom
+#     file), the timings, I/O counters and card response times are written
+#     into that file on exit (see metrics.py).
+
+
+import time
+_STARTED = time.perf_counter()  # The start of the startup timing mode
 
 import tkinter as tk
 from tkinter import ttk
-import json
-from datetime import datetime
 import os
-from data_handler import get_topics_English_to_Ukranian, get_topics_Ukranian_to_English
-from services_quiz_engine import Card, make_deck, check_answer, Result, run_quiz_round
+from background import LatencyProbe, StartupTimer, TkWorker, run_in_background
+from deck_format import DIRECTIONS, available_directions, topic_words
+
+
+# The vocabulary: a CSV file or an SQLite store made by vocab_store.py
+DATA_FILE = os.environ.get("WORDCARDS_DATA", "data/WordCards.csv")
+
+# The most due cards counted for the Home screen ("99+" above it)
+DUE_SHOWN = 99
+
+# The ttk styles of the screens; each style is configured when the first
+# screen which uses it is built
+STYLES = {
+    "Quiz.TFrame": dict(background="#9370DB"),
+    "Quiz.TButton": dict(font=("Arial", 16, "bold"), foreground="#696969", background="#FFFF00", padding=10),
+    "Quiz.TLabel": dict(font=("Arial", 18, "bold"), foreground="#696969", background="#FFFF00"),
+    "Quiz.TEntry": dict(font=("Arial", 18), fieldbackground="#F8F8FF", foreground="#696969", padding=10),
+    "Quiz.TCombobox": dict(font=("Arial", 18), fieldbackground="#F8F8FF", background="#F8F8FF", foreground="#696969", padding=10),
+    "Quiz.TCheckbutton": dict(font=("Arial", 16), foreground="#FFFFF0", background="#9370DB"),
+}
 
 
 class QuizApp(tk.Tk):
@@ -34,55 +74,262 @@ class QuizApp(tk.Tk):
 
     def __init__(self):
         """
-        Initialize the main Tkinter window, configure styles, load topics, 
-        and build the Home screen.
+        Initialize the main Tkinter window, show the Home screen
+        and start loading the topics in the background.
         """
         super().__init__()
+        self.timer = StartupTimer(self, _STARTED) if os.environ.get("WORDCARDS_STARTUP") else None
+        if self.timer:
+            self.timer.mark("window")
         self.title("Word Cards")
         self.geometry("750x460")
         self.resizable(False, False)
-        # Configure styles for ttk widgets
+        # The styles for ttk widgets are configured by the screens (see use_styles)
         self.style = ttk.Style()
         self.style.theme_use('clam')
-        self.style.configure("Quiz.TFrame", background="#9370DB")
-        self.style.configure("Quiz.TButton", font=("Arial", 16, "bold"), foreground="#696969", background="#FFFF00", padding=10)
-        self.style.configure("Quiz.TLabel", font=("Arial", 18, "bold"), foreground="#696969", background="#FFFF00")
-        self.style.configure("Quiz.TEntry", font=("Arial", 18), fieldbackground="#F8F8FF", foreground="#696969", padding=10)
-        self.style.configure("Quiz.TCombobox", font=("Arial", 18), fieldbackground="#F8F8FF", background="#F8F8FF", foreground="#696969", padding=10)
-        # Load topics from CSV files
-        self.topics_E2U = get_topics_English_to_Ukranian("data/WordCards.csv")
-        self.topics_U2E = get_topics_Ukranian_to_English("data/WordCards.csv")
-        self.direction = tk.StringVar(value="English to Ukranian")
-        self.topic = tk.StringVar(value=sorted(self.topics_E2U.keys())[0])
-        # Build the Home screen
-        self.build_home()
+        self.configured_styles = set()
+        # The screens are built once and then only hidden and shown
+        self.screens = {}
+        self.current_screen = None
+        # Only the topic names are needed for the Home screen, they are read
+        # in the background; the words of a topic are read when the quiz starts
+        self.catalog = None
+        self.direction = tk.StringVar(value=next(iter(DIRECTIONS)))
+        self.topic = tk.StringVar(value="")
+        self.due_only = tk.BooleanVar(value=False)
+        self.multiple_choice = tk.BooleanVar(value=False)
+        # The results are kept in the "results" folder near the file with code
+        base_dir = os.path.dirname(os.path.abspath(__file__))
+        self.results_dir = os.path.join(base_dir, "results")
+        # The results store and the scheduler are used only inside the jobs
+        # of the worker thread, so they need no locks
+        self.worker = TkWorker(self)
+        self.results = None
+        self.scheduler = None
+        self.card_stats = None
+        self.journal = None
+        self.worker.submit(self.open_stores)
+        self.worker.submit(self.load_journal, on_done=self.offer_resume)
+        self.prefetched = None  # (key, deck, answer index, distractor index) prepared on the Home screen
+        self.is_retry = False
+        self.last_result = None
+        self.distractors = None     # The DistractorIndex of the round in the multiple-choice mode
+        self.options = []           # The options of the current card
+        self.probe = LatencyProbe(self) if os.environ.get("WORDCARDS_PROBE") else None
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+        # Show the Home screen
+        self.show_screen("home")
+        if self.timer:
+            self.timer.mark("home screen")
+            self.timer.first_frame()
+        self.load_catalog(DATA_FILE)
+
+
+    def use_styles(self, *names):
+        """
+        Configure the ttk styles which were not configured yet.
+        """
+        for name in names:
+            if name not in self.configured_styles:
+                self.style.configure(name, **STYLES[name])
+                self.configured_styles.add(name)
+
+
+    def show_screen(self, name):
+        """
+        Show the screen ("home", "quiz" or "result") instead of the current
+        one. The screen is built by build_<name>() the first time; later
+        the same frame is shown again, the hidden screens keep their widgets.
+        """
+        frame = self.screens.get(name)
+        if self.timer:
+            self.timer.transition(name if frame is not None else name + " (build)")
+        if frame is None:
+            frame = self.screens[name] = getattr(self, "build_" + name)()
+        if self.current_screen is not frame:
+            if self.current_screen is not None:
+                self.current_screen.pack_forget()
+            frame.pack(fill="both", expand=True)
+            self.current_screen = frame
+        return frame
+
+
+    def on_screen(self, name):
+        """
+        Return True if the screen is shown now.
+        """
+        return self.current_screen is not None and self.current_screen is self.screens.get(name)
+
+
+    def load_catalog(self, file):
+        """
+        Read the topics of the CSV file (or the vocabulary store) in a background
+        thread, showing the progress on the Home screen, and fill the topic
+        combobox when ready.
+        """
+        def work(report):
+            from data_handler import open_vocabulary  # Imported here to start the window faster
+
+            return open_vocabulary(file, on_progress=report)
+
+        def progress(done, total):
+            self.previous_result_lb.config(text=f"Завантаження тем... {100 * done // max(total, 1)}%")
+
+        def done(catalog):
+            self.catalog = catalog
+            names = catalog.names()
+            if names and not self.topic.get():
+                self.topic.set(names[0])
+            self.topic_cb.config(values=names)
+            # A deck file may have more languages than English and Ukrainian
+            directions = available_directions(catalog)
+            self.direction_cb.config(values=directions)
+            if directions and self.direction.get() not in directions:
+                self.direction.set(directions[0])
+            self.previous_result_lb.config(text="")
+            if self.timer:
+                self.timer.mark("topics loaded")
+            if self.on_screen("home"):
+                self.show_results_chosen_topic()
+
+        def error(exc):
+            self.previous_result_lb.config(text=f"Не вдалося завантажити теми: {exc}")
+
+        run_in_background(self, work, on_done=done, on_progress=progress, on_error=error)
+
+
+    def open_stores(self):
+        """
+        Open the results store and the review schedule (runs in the worker thread).
+        """
+        from results_store import JOURNAL_NAME, ResultsStore, SessionJournal, load_card_stats, load_schedule
+
+        self.results = ResultsStore(self.results_dir)
+        self.scheduler = load_schedule(self.results_dir)
+        self.card_stats = load_card_stats(self.results_dir)
+        self.journal = SessionJournal(os.path.join(self.results_dir, JOURNAL_NAME))
+
+
+    def load_journal(self):
+        """
+        Read the journal of the round which was not finished last time
+        (runs in the worker thread). A round with all the cards answered,
+        but closed before its result was saved, is saved now. Returns the
+        state of the journal if the round can be resumed, otherwise None.
+        """
+        state = self.journal.load()
+        if state is None or len(state["grades"]) < len(state["prompts"]):
+            return state
+        session = self.replay_journal(state)[2]
+        self.persist_round(state["topic"], state["direction"], session.deck, session.finish(), bool(state.get("retry")))
+        self.journal.discard()
+        return None
+
+
+    def replay_journal(self, state):
+        """
+        Return (deck, answer index, session) of the round saved in the journal:
+        the same deck in the same order with the saved grades replayed.
+        """
+        from services_quiz_engine import Deck, QuizSession
+        from answer_matching import AnswerIndex
+
+        deck = Deck(state["prompts"], state["answers"])
+        answer_index = AnswerIndex(state["answers"])
+        session = QuizSession(deck, answer_index)
+        for grade in state["grades"]:
+            session.replay(grade)
+        return deck, answer_index, session
+
+
+    def offer_resume(self, state):
+        """
+        Offer to resume the round which was not finished last time
+        (state is the journal read by load_journal(), or None).
+        """
+        if state is None or not self.on_screen("home"):
+            return # Nothing to resume, or a new round has already started
+        from tkinter import messagebox
+
+        answered, total = len(state["grades"]), len(state["prompts"])
+        if messagebox.askyesno("WordCards", f"Минулого разу тему \"{state['topic']}\" не завершено "
+                               f"({answered}/{total}). Продовжити?", parent=self):
+            self.worker.submit(self.prepare_resume, state, on_done=self.resume_round)
+        else:
+            self.worker.submit(self.journal.discard)
+
+
+    def prepare_resume(self, state):
+        """
+        Restore the round saved in the journal (runs in the worker thread,
+        like prepare_deck()). Returns (state, deck, answer index, distractors, session).
+        """
+        from distractors import DistractorIndex, distractor_index
+
+        deck, answer_index, session = self.replay_journal(state)
+        distractors = None
+        if state.get("multiple_choice"):
+            topic, direction = state["topic"], state["direction"]
+            catalog = self.catalog
+            if catalog is not None and topic in catalog and direction in available_directions(catalog):
+                distractors = distractor_index(catalog, topic, direction)
+            else:
+                distractors = DistractorIndex(state["answers"]) # The topics are still loading
+        return state, deck, answer_index, distractors, session
+
+
+    def resume_round(self, prepared):
+        """
+        Switch from the Home screen to the Quiz screen for the restored round
+        at its next card.
+        """
+        if not self.on_screen("home"):
+            return # A new round has already started
+        state, deck, answer_index, distractors, session = prepared
+        self.deck = deck
+        self.answer_index = answer_index
+        self.distractors = distractors
+        self.round_topic, self.round_direction = state["topic"], state["direction"]
+        self.is_retry = bool(state.get("retry"))
+        self.prefetched = None
+        self.start_round(session=session, journal_size=state["size"])
+
+
+    def command(self, name, handler):
+        """
+        Return the handler for a button, measured by the latency probe if it is on.
+        """
+        return self.probe.wrap(name, handler) if self.probe else handler
 
 
     def build_home(self):
         """
         Build the Home screen where the user selects the translation direction
         and the topic. Includes 'Start' button to begin the quiz.
+        Returns the frame of the screen.
         """
+        self.use_styles("Quiz.TFrame", "Quiz.TLabel", "Quiz.TCombobox", "Quiz.TCheckbutton", "Quiz.TButton")
         self.home = ttk.Frame(self, style="Quiz.TFrame", padding=32)
-        self.home.pack(fill="both", expand=True)
         ttk.Label(self.home, text="Направлення перекладу", style="Quiz.TLabel").grid(row=0, column=0, sticky="e", padx=10, pady=10)
         ttk.Label(self.home, text="Оберіть тему", style="Quiz.TLabel").grid(row=1, column=0, sticky="e", padx=10, pady=10)
         # Direction combobox
-        ttk.Combobox(
+        self.direction_cb = ttk.Combobox(
             self.home,
             textvariable=self.direction,
-            values=["English to Ukranian", "Ukranian to English"],
+            values=list(DIRECTIONS),
             state="readonly",
             width=30,
             height=6,
             style="Quiz.TCombobox",
             font=("Arial", 18)
-        ).grid(row=0, column=1, sticky="e")
+        )
+        self.direction_cb.grid(row=0, column=1, sticky="e")
+        self.direction_cb.bind("<<ComboboxSelected>>", self.prefetch_deck)
         # Topic combobox
         self.topic_cb = ttk.Combobox(
             self.home,
             textvariable=self.topic,
-            values=sorted(self.topics_E2U.keys()),
+            values=self.catalog.names() if self.catalog else [],
             state="readonly",
             width=35,
             height=10,
@@ -91,15 +338,19 @@ class QuizApp(tk.Tk):
         )
         self.topic_cb.grid(row=1, column=1, sticky="w", padx=10, pady=10)
         self.topic_cb['height'] = 10
-        self.topic_cb.bind("<<ComboboxSelected>>", self.show_results_chosen_topic)
+        self.topic_cb.bind("<<ComboboxSelected>>", self.command("topic", self.show_results_chosen_topic))
+        # Practice only the cards which are due for the review
+        self.due_cb = ttk.Checkbutton(self.home, text="Тільки картки до повторення", variable=self.due_only, command=self.prefetch_deck, style="Quiz.TCheckbutton")
+        self.due_cb.grid(row=2, column=0, columnspan=2)
+        # Pick the answer among the options instead of typing it
+        ttk.Checkbutton(self.home, text="Вибір з варіантів", variable=self.multiple_choice, command=self.prefetch_deck, style="Quiz.TCheckbutton").grid(row=3, column=0, columnspan=2)
         # Label in case chosen topic is worked erlier
         self.previous_result_lb = ttk.Label(self.home, font=("Arial", 18), foreground="#FFFFF0", background="#9370DB")
-        self.previous_result_lb.grid(row=2, column=0, columnspan=2, pady=12, ipady=6)
+        self.previous_result_lb.grid(row=4, column=0, columnspan=2, pady=12, ipady=6)
         self.home.columnconfigure(1, weight=1)
         # Start button
-        ttk.Button(self.home, text="Почати!", command=self.start_quiz, style="Quiz.TButton").grid(row=3, column=0, columnspan=2, pady=12, ipady=6)      
-        #Show the previous results if they were
-        self.show_results_chosen_topic()
+        ttk.Button(self.home, text="Почати!", command=self.command("start", self.start_quiz), style="Quiz.TButton").grid(row=5, column=0, columnspan=2, pady=12, ipady=6)      
+        return self.home
 
 
     def show_results_chosen_topic(self, event=None):
@@ -108,61 +359,174 @@ class QuizApp(tk.Tk):
         of a chosen topic if that topic was worked erlier.
         """
         topic = self.topic.get()
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-        results_dir = os.path.join(base_dir, "results")
-        filename = "saved_result.json"
-        os.makedirs(results_dir, exist_ok=True)
-        filepath = os.path.join(results_dir, filename)
-        if os.path.exists(filepath):
-            with open(filepath, "r", encoding="utf-8") as f:
-                saved_result_json = json.load(f)
+        if not topic:
+            return # The topics are still loading
+
+        def shown(entry):
+            from results_store import format_result  # Already imported by open_stores
+
+            if self.topic.get() == topic:
+                self.previous_result_lb.config(text=format_result(entry) if entry else "")
+
+        self.worker.submit(lambda: self.results.lookup(topic), on_done=shown)
+        self.show_due_count()
+        self.prefetch_deck()
+
+
+    def show_due_count(self):
+        """
+        Show on the Home screen how many cards of all topics are due for
+        the review. The scheduler finds them in its priority queue, so only
+        the due cards (at most DUE_SHOWN + 1) are looked at, not all cards.
+        """
+        def shown(n):
+            count = f"{DUE_SHOWN}+" if n > DUE_SHOWN else str(n)
+            self.due_cb.config(text=f"Тільки картки до повторення (у всіх темах: {count})")
+
+        self.worker.submit(lambda: len(self.scheduler.due_cards(DUE_SHOWN + 1)), on_done=shown)
+
+
+    def deck_key(self):
+        """
+        Return the (topic, direction, due_only, multiple_choice) choice of the Home screen.
+        """
+        return self.topic.get(), self.direction.get(), self.due_only.get(), self.multiple_choice.get()
+
+
+    def prefetch_deck(self, event=None):
+        """
+        Prepare the deck of the chosen topic in the worker thread while
+        the user is still on the Home screen.
+        """
+        key = self.deck_key()
+        if self.catalog is None or key[0] not in self.catalog:
+            return
+        if self.prefetched is not None and self.prefetched[0] == key:
+            return
+
+        def ready(prepared):
+            self.prefetched = prepared
+
+        self.worker.submit(self.prepare_deck, key, on_done=ready)
+
+
+    def prepare_deck(self, key):
+        """
+        Read the words of the topic, create the deck and the index of its
+        answers (runs in the worker thread). Returns (key, deck, index,
+        distractors), the distractors only for the multiple-choice mode.
+        The cards the user often misses tend to come first in the deck.
+        """
+        from services_quiz_engine import make_deck
+        from answer_matching import AnswerIndex
+        from distractors import distractor_index
+
+        topic, direction, due_only, multiple_choice = key
+        data = topic_words(self.catalog, topic, direction)
+        if due_only:
+            deck = make_deck(data, mode="due", scheduler=self.scheduler, topic=topic, direction=direction)
         else:
-            saved_result_json = {}
-        if topic in saved_result_json:
-            k1 = "Дата"
-            k2 = "Результат"
-            text_res = f"Дата проходження теми: {saved_result_json[topic][k1]}.\nРезультат: {saved_result_json[topic][k2]}"
-            self.previous_result_lb.config(text=text_res)
+            # The whole topic in the weighted order (a sort; the alias table
+            # pays off only for a few cards of a big topic)
+            deck = make_deck(data, mode="hard", stats=self.card_stats, topic=topic, direction=direction)
+        # The distractors are cached with the words of the topic
+        distractors = distractor_index(self.catalog, topic, direction) if multiple_choice else None
+        # The accepted answers of the deck are normalized once for the whole round
+        return key, deck, AnswerIndex(card.answer for card in deck), distractors
 
 
     def start_quiz(self):
         """
-        Start the quiz by creating a deck of cards for the selected topic
-        and translation direction. Destroys the Home screen and builds the Quiz screen.
+        Start the quiz with the deck of cards for the selected topic and
+        translation direction: the prefetched one if it is ready, otherwise
+        it is prepared in the worker first.
         """
-        topic = self.topic.get()
-        direction = self.direction.get()
-        if direction == "English to Ukranian":
-            data = self.topics_E2U[topic]
+        key = self.deck_key()
+        if self.catalog is None or key[0] not in self.catalog:
+            return # The topics are still loading
+        if self.prefetched is not None and self.prefetched[0] == key:
+            self.begin_round(self.prefetched)
         else:
-            data = self.topics_U2E[topic]
-        self.deck = make_deck(data)
-        self.answers = []
-        self.home.destroy()
-        self.build_quiz()
+            self.worker.submit(self.prepare_deck, key, on_done=self.begin_round)
+
+
+    def begin_round(self, prepared):
+        """
+        Switch from the Home screen to the Quiz screen for the prepared deck.
+        """
+        if not self.on_screen("home"):
+            return # The round has already started
+        self.prefetched = None
+        key, deck, answer_index, distractors = prepared
+        if not deck:
+            self.previous_result_lb.config(text="Немає карток до повторення в цій темі.")
+            return
+        self.round_topic, self.round_direction = key[0], key[1]
+        self.deck = deck
+        self.answer_index = answer_index
+        self.distractors = distractors
+        self.is_retry = False
+        self.start_round()
 
 
     def build_quiz(self):
         """
         Build the Quiz screen with question display, input field,
         buttons for submitting and skipping, and feedback label.
+        Returns the frame of the screen.
         """
-        if hasattr(self, 'quiz') and self.quiz.winfo_exists():
-            self.quiz.destroy()
-        self.idx = 0
+        self.use_styles("Quiz.TFrame", "Quiz.TLabel", "Quiz.TEntry", "Quiz.TButton")
         self.quiz = ttk.Frame(self, style="Quiz.TFrame", padding=16)
-        self.quiz.pack(fill="both", expand=True)
         self.question = ttk.Label(self.quiz, style="Quiz.TLabel")
         self.question.pack(anchor="w")
         self.user_answer = ttk.Entry(self.quiz, style="Quiz.TEntry")
         self.user_answer.pack(fill="x")
-        btns = ttk.Frame(self.quiz)
-        btns.pack(pady=8)
-        ttk.Button(btns, text="Відповісти", command=self.submit_answer, style="Quiz.TButton").pack(side="left", padx=4, ipady=6)
-        ttk.Button(btns, text="Пропустити картку", command=self.skip_card, style="Quiz.TButton").pack(side="left", padx=4, ipady=6)
+        # The options of the multiple-choice mode, packed only in that mode
+        self.choices = ttk.Frame(self.quiz, style="Quiz.TFrame")
+        self.choice_btns = []
+        for i in range(4):
+            btn = ttk.Button(self.choices, command=self.command("choice", lambda i=i: self.choose_option(i)), style="Quiz.TButton")
+            btn.grid(row=i // 2, column=i % 2, sticky="ew", padx=4, pady=4)
+            self.choice_btns.append(btn)
+        self.choices.columnconfigure((0, 1), weight=1)
+        self.quiz_btns = ttk.Frame(self.quiz)
+        self.quiz_btns.pack(pady=8)
+        self.submit_btn = ttk.Button(self.quiz_btns, text="Відповісти", command=self.command("submit", self.submit_answer), style="Quiz.TButton")
+        self.submit_btn.pack(side="left", padx=4, ipady=6)
+        self.skip_btn = ttk.Button(self.quiz_btns, text="Пропустити картку", command=self.command("skip", self.skip_card), style="Quiz.TButton")
+        self.skip_btn.pack(side="left", padx=4, ipady=6)
         self.feedback = ttk.Label(self.quiz, style="Quiz.TLabel")
         self.feedback.pack(anchor="w", pady=6)
-        # Show the first card
+        return self.quiz
+
+
+    def start_round(self, session=None, journal_size=None):
+        """
+        Show the Quiz screen with a new session for self.deck and its first card.
+        With session (restored from the journal by prepare_resume()) the round
+        goes on at its next card and the journal is continued after
+        journal_size bytes, otherwise a new journal of the round is started.
+        """
+        from services_quiz_engine import QuizSession
+
+        # All the state of the round is kept by the session
+        if session is not None:
+            self.session = session
+            self.worker.submit(self.journal.reopen, journal_size)
+        else:
+            self.session = QuizSession(self.deck, self.answer_index)
+            self.worker.submit(self.journal.start, self.round_topic, self.round_direction,
+                               self.deck, self.is_retry, self.distractors is not None)
+        self.show_screen("quiz")
+        # Switch between typing the answer and choosing it
+        if self.distractors is not None:
+            self.user_answer.pack_forget()
+            self.submit_btn.pack_forget()
+            self.choices.pack(fill="x", before=self.quiz_btns)
+        else:
+            self.choices.pack_forget()
+            self.user_answer.pack(fill="x", before=self.quiz_btns)
+            self.submit_btn.pack(side="left", padx=4, ipady=6, before=self.skip_btn)
         self.show_card()
 
 
@@ -171,13 +535,21 @@ class QuizApp(tk.Tk):
         Display the current card from the deck, clear the input field,
         and update feedback with the current progress.
         """
-        if self.idx >= len(self.deck):
+        card = self.session.current()
+        if card is None:
             self.finish_round()
             return
-        card = self.deck[self.idx]
         self.question.config(text=card.prompt)
-        self.user_answer.delete(0, tk.END)
-        self.feedback.config(text=f"{self.idx+1}/{len(self.deck)}")
+        if self.distractors is not None:
+            self.options = self.distractors.options(card.answer)
+            for btn, option in zip(self.choice_btns, self.options):
+                btn.config(text=option, state="normal")
+                btn.grid()
+            for btn in self.choice_btns[len(self.options):]:
+                btn.grid_remove() # A small topic has fewer different answers
+        else:
+            self.user_answer.delete(0, tk.END)
+        self.feedback.config(text=f"{self.session.idx+1}/{len(self.deck)}")
 
 
     def skip_card(self):
@@ -185,13 +557,15 @@ class QuizApp(tk.Tk):
         Skip the current card without answering.
         Show correct answer and move to the next card after a short delay.
         """
-        user_input = ""
-        if self.idx < len(self.deck):
-            card = self.deck[self.idx]
+        from services_quiz_engine import SKIPPED
+
+        if not self.session.done:
+            i = self.session.idx
+            card = self.session.skip()
+            self.worker.submit(self.journal.record, i, SKIPPED)
+            self.disable_choices()
             self.feedback.config(text=f"Правильна відповідь: {card.answer}")
-            self.answers.append(user_input)
-            self.idx += 1
-            if self.idx >= len(self.deck):
+            if self.session.done:
                 self.after(1000, self.finish_round)
             else:
                 self.after(1000, self.show_card)
@@ -202,102 +576,169 @@ class QuizApp(tk.Tk):
         Submit the user's answer for the current card,
         check correctness, display feedback, and move to next card.
         """
-        card = self.deck[self.idx]
-        user_input = self.user_answer.get()
-        self.answers.append(user_input)
-        ok = check_answer(user_input, card)
-        if ok:
+        from answer_matching import EXACT, NEAR
+
+        if self.session.done:
+            return
+        i, card = self.session.idx, self.session.current()
+        grade = self.session.submit(self.user_answer.get())
+        self.worker.submit(self.journal.record, i, grade)
+        if grade == EXACT:
             self.feedback.config(text="Вірно!")
+        elif grade == NEAR:
+            self.feedback.config(text=f"Майже вірно! Правильна відповідь: {card.answer}")
         else:
             self.feedback.config(text=f"Невірно. Правильна відповідь: {card.answer}")
-        self.idx += 1
         self.after(1000, self.show_card)
 
 
+    def choose_option(self, i):
+        """
+        Grade the option the user picked in the multiple-choice mode,
+        display feedback, and move to next card.
+        """
+        from answer_matching import EXACT
+
+        if self.session.done:
+            return
+        idx, card = self.session.idx, self.session.current()
+        grade = self.session.submit_choice(self.options[i])
+        self.worker.submit(self.journal.record, idx, grade)
+        self.disable_choices() # Until the next card is shown
+        if grade == EXACT:
+            self.feedback.config(text="Вірно!")
+        else:
+            self.feedback.config(text=f"Невірно. Правильна відповідь: {card.answer}")
+        self.after(1000, self.show_card)
+
+
+    def disable_choices(self):
+        """
+        Disable the option buttons while the feedback is shown.
+        """
+        for btn in self.choice_btns:
+            btn.config(state="disabled")
+
+
     def finish_round(self):
         """
-        Finish the quiz round, calculate the score,
-        destroy the Quiz screen, and build the Result screen.
+        Finish the quiz round, calculate the score
+        and switch to the Result screen.
+        """
+        def graded(res):
+            pct = (100 * res.correct) / len(self.deck)
+            self.show_result(res, pct)
+            self.save_results(res)
+            self.worker.submit(self.journal.discard) # The round is saved in the results now
+
+        self.worker.submit(self.session.finish, on_done=graded)
+
+
+    def build_result(self):
+        """
+        Build the Result screen with the labels for the score and buttons
+        for reviewing errors or returning home. Returns the frame of the screen.
         """
-        res = run_quiz_round(self.deck, self.answers)
-        pct = (100 * res.correct) / len(self.deck)
-        self.quiz.destroy()
-        self.build_result(res, pct)
-        self.save_results(res)
+        self.use_styles("Quiz.TFrame", "Quiz.TLabel", "Quiz.TButton")
+        self.result = ttk.Frame(self, style="Quiz.TFrame", padding=16)
+        self.result_lb = ttk.Label(self.result, style="Quiz.TLabel")
+        self.result_lb.pack()
+        # Shown only when there are near misses
+        self.near_miss_lb = ttk.Label(self.result, style="Quiz.TLabel")
+        ttk.Button(self.result, text="Робота над помилками", command=self.command("retry", lambda: self.retry_errors(self.last_result)), style="Quiz.TButton").pack(pady=4, ipady=6)
+        ttk.Button(self.result, text="На головний екран", command=self.command("home", self.reset_to_home), style="Quiz.TButton").pack(pady=4, ipady=6)
+        return self.result
 
 
-    def build_result(self, res, pct):
+    def show_result(self, res, pct):
         """
-        Build the Result screen showing percentage correct,
-        total correct answers, and buttons for reviewing errors or returning home.
+        Show the Result screen with the percentage correct
+        and total correct answers.
 
         Parameters:
             res (Result): Result object containing quiz outcome
             pct (float): Percentage of correct answers
         """
-        if hasattr(self, 'result') and self.result.winfo_exists():
-            self.result.destroy()
-        self.result = ttk.Frame(self, style="Quiz.TFrame", padding=16)
-        self.result.pack(fill="both", expand=True)
-        lbl_result = ttk.Label(self.result, text=f"Результат: {pct}%. Правильних відповідей: {res.correct}/{res.total}", style="Quiz.TLabel")
-        lbl_result.pack()
-        ttk.Button(self.result, text="Робота над помилками", command=lambda: self.retry_errors(res), style="Quiz.TButton").pack(pady=4, ipady=6)
-        ttk.Button(self.result, text="На головний екран", command=self.reset_to_home, style="Quiz.TButton").pack(pady=4, ipady=6)
+        self.last_result = res
+        self.show_screen("result")
+        self.result_lb.config(text=f"Результат: {pct}%. Правильних відповідей: {res.correct}/{res.total}")
+        if res.near_miss_cards:
+            self.near_miss_lb.config(text=f"З них з невеликими помилками: {len(res.near_miss_cards)}")
+            self.near_miss_lb.pack(after=self.result_lb, pady=4)
+        else:
+            self.near_miss_lb.pack_forget()
 
 
     def retry_errors(self, res):
         """
-        Retry only the cards that were answered incorrectly.
-        Rebuild the Quiz screen for these wrong cards.
+        Retry only the cards that were answered incorrectly
+        on the Quiz screen with a new session for these wrong cards.
 
         Parameters:
             res (Result): Result object containing wrong_cards list
         """
+        if not res.wrong_cards:
+            return
         self.deck = res.wrong_cards
-        self.answers = []
-        self.result.destroy()
-        self.build_quiz()
+        self.is_retry = True
+        self.start_round()
 
 
     def reset_to_home(self):
         """
-        Destroy the Result screen and return to the Home screen.
+        Return to the Home screen and show the result of the chosen topic.
         """
-        self.result.destroy()
-        self.build_home()
+        self.show_screen("home")
+        self.show_results_chosen_topic()
 
 
     def save_results(self, res):
         """
-        Create a json file with result of each worked topic.
-        If such file already exists - add new information to json file. 
+        Save the result of the round in the worker thread.
         """
-        # Define the repo "results" near the file with code
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-        results_dir = os.path.join(base_dir, "results")
-        filename = "saved_result.json"
-        # Create the repo if it does not exist yet 
-        os.makedirs(results_dir, exist_ok=True)
-        # The full path to file
-        filepath = os.path.join(results_dir, filename)
-        # If such file already exist - open it and read as pethon's dict
-        if os.path.exists(filepath):
-            with open(filepath, "r", encoding="utf-8") as f:
-                saved_result_json = json.load(f)
-        # If not - creat an ampty dict
-        else:
-            saved_result_json = {}
-        # Create the data we need to be putting into the label on the home screen near the topic
-        topic = self.topic.get()
-        day = datetime.now().strftime("%d.%m.%Y")
-        # Update the existing or newly created saved_result_json python object by adding the results data
-        saved_result_json[topic] = {
-            "Дата" : day,
-            "Результат" : f"Правильних відповідей {res.correct}/{res.total}."
-        }           
-        # Wrute a new updated json file with old dat (if it was) and new data
-        with open(filepath, "w", encoding="utf-8") as json_file:
-            json.dump(saved_result_json, json_file, ensure_ascii=False, indent=4)
+        self.worker.submit(self.persist_round, self.round_topic, self.round_direction, self.deck, res, self.is_retry)
+
+
+    def persist_round(self, topic, direction, deck, res, is_retry):
+        """
+        Append the result of the round to the results store and update
+        the review schedule and the statistics of its cards (not for the work on mistakes,
+        where the user has just seen the correct answers).
+        Runs in the worker thread.
+        """
+        from results_store import save_card_stats, save_schedule
+
+        self.results.append(topic, res.correct, res.total, direction=direction,
+                            wrong=[card.prompt for card in res.wrong_cards], retry=is_retry)
+        if not is_retry:
+            self.scheduler.record_round(topic, direction, deck, res)
+            save_schedule(self.results_dir, self.scheduler)
+            self.card_stats.record_round(topic, direction, deck, res)
+            save_card_stats(self.results_dir, self.card_stats)
+
+
+    def on_close(self):
+        """
+        Wait for the worker to save everything, compact the results store
+        and close the window. With the WORDCARDS_STATS environment variable
+        set, print the counters of the results cache for this session, with
+        WORDCARDS_PROBE the measured latencies and with WORDCARDS_STARTUP
+        the startup and transition times. With WORDCARDS_METRICS the metrics
+        of the session are exported.
+        """
+        import metrics
+
+        self.worker.submit(lambda: self.results.close())
+        self.worker.submit(lambda: self.journal.close()) # An unfinished round is kept for the next launch
+        self.worker.shutdown()
+        if os.environ.get("WORDCARDS_STATS"):
+            print(self.results.stats.summary())
+        if self.probe:
+            print(self.probe.summary())
+        if self.timer:
+            print(self.timer.summary())
+        metrics.export()
+        self.destroy()
         
 
 if __name__ == "__main__":
@@ -0,0 +1,313 @@
+# Description: This module contains the VocabStore class, an SQLite store of
+# the vocabulary with an API for bulk changes: upsert, delete, renaming of
+# topics and reporting of duplicates, plus import from and export to the CSV
+# format of data/WordCards.csv.
+#
+# Every word is one row of the "words" table with a unique index on
+# (topic, English word), so a change touches only its rows instead of
+# rewriting the whole file, and the conflicts are found by an index lookup.
+# The store has the same reading interface as data_handler.TopicCatalog
+# (names(), english_to_ukranian(), ukranian_to_english()), so the
+# application and the get_topics_* functions can read from it.
+#
+# Usage:
+#   python vocab_store.py import data/WordCards.csv data/WordCards.db
+#   python vocab_store.py export data/WordCards.db data/WordCards.csv
+#   python vocab_store.py add data/WordCards.db "cat" "кіт" "Animals"
+#   python vocab_store.py remove data/WordCards.db "cat" "Animals"
+#   python vocab_store.py rename-topic data/WordCards.db "IT" "Information technology"
+#   python vocab_store.py dedupe data/WordCards.db
+
+
+import csv
+import sqlite3
+
+from data_handler import iter_row_batches
+
+
+STORE_SUFFIXES = (".db", ".sqlite", ".sqlite3")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS topics (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS words (
+    id INTEGER PRIMARY KEY,
+    topic_id INTEGER NOT NULL REFERENCES topics(id),
+    eng_word TEXT NOT NULL,
+    ukr_word TEXT NOT NULL,
+    UNIQUE (topic_id, eng_word)
+);
+CREATE INDEX IF NOT EXISTS words_ukr ON words (topic_id, ukr_word);
+"""
+
+
+def is_vocab_store(path):
+    """
+    Return True if the path is a vocabulary store (by its extension).
+    """
+    return str(path).lower().endswith(STORE_SUFFIXES)
+
+
+class VocabStore:
+    """
+    The vocabulary in an SQLite database.
+
+    The changes are made in transactions: a bulk operation either applies
+    completely or not at all. The connection may be used from another
+    thread than the one which opened it, but only from one thread at a time.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript(_SCHEMA)
+        self._topic_ids = dict(self.db.execute("SELECT name, id FROM topics"))
+
+    def close(self):
+        self.db.close()
+
+    def _topic_id(self, name, created):
+        """
+        Return the id of the topic, creating it if it does not exist.
+        The new topics are put into created, not into the cache: they
+        exist only if the transaction is committed.
+        """
+        topic_id = self._topic_ids.get(name) or created.get(name)
+        if topic_id is None:
+            topic_id = created[name] = self.db.execute("INSERT INTO topics (name) VALUES (?)", (name,)).lastrowid
+        return topic_id
+
+    def upsert(self, rows):
+        """
+        Add or update the words. rows is an iterable of (eng_word, ukr_word, topic).
+
+        A word which already exists in the topic with another translation
+        is a conflict: the new translation replaces the old one and the
+        conflict is reported. Returns the dictionary with the numbers of
+        "inserted", "updated" and "unchanged" rows and the list of
+        "conflicts" (topic, eng_word, old ukr_word, new ukr_word).
+        """
+        report = {"inserted": 0, "updated": 0, "unchanged": 0, "conflicts": []}
+        created = {}
+        with self.db:
+            for eng_word, ukr_word, topic in rows:
+                eng_word, ukr_word, topic = eng_word.strip(), ukr_word.strip(), topic.strip()
+                if not (eng_word and ukr_word and topic):
+                    continue
+                topic_id = self._topic_id(topic, created)
+                old = self.db.execute(
+                    "SELECT id, ukr_word FROM words WHERE topic_id = ? AND eng_word = ?", (topic_id, eng_word)
+                ).fetchone()
+                if old is None:
+                    self.db.execute(
+                        "INSERT INTO words (topic_id, eng_word, ukr_word) VALUES (?, ?, ?)", (topic_id, eng_word, ukr_word)
+                    )
+                    report["inserted"] += 1
+                elif old[1] == ukr_word:
+                    report["unchanged"] += 1
+                else:
+                    self.db.execute("UPDATE words SET ukr_word = ? WHERE id = ?", (ukr_word, old[0]))
+                    report["updated"] += 1
+                    report["conflicts"].append((topic, eng_word, old[1], ukr_word))
+        self._topic_ids.update(created)  # Committed
+        return report
+
+    def delete(self, rows):
+        """
+        Delete the words. rows is an iterable of (eng_word, topic).
+        Returns the number of deleted words.
+        """
+        deleted = 0
+        with self.db:
+            for eng_word, topic in rows:
+                topic_id = self._topic_ids.get(topic.strip())
+                if topic_id is not None:
+                    deleted += self.db.execute(
+                        "DELETE FROM words WHERE topic_id = ? AND eng_word = ?", (topic_id, eng_word.strip())
+                    ).rowcount
+        return deleted
+
+    def delete_topic(self, topic):
+        """
+        Delete the topic with all its words. Returns the number of deleted words.
+        """
+        topic_id = self._topic_ids.get(topic)
+        if topic_id is None:
+            return 0
+        with self.db:
+            deleted = self.db.execute("DELETE FROM words WHERE topic_id = ?", (topic_id,)).rowcount
+            self.db.execute("DELETE FROM topics WHERE id = ?", (topic_id,))
+        del self._topic_ids[topic]
+        return deleted
+
+    def rename_topic(self, old, new):
+        """
+        Rename the topic. If the topic "new" already exists, the words are
+        moved into it; the words which already exist there are reported as
+        conflicts and the ones of the renamed topic win.
+        Returns the list of conflicts (eng_word, ukr_word kept, ukr_word dropped).
+        """
+        old_id = self._topic_ids.get(old)
+        if old_id is None:
+            raise KeyError(old)
+        new_id = self._topic_ids.get(new)
+        if new_id is None:
+            with self.db:
+                self.db.execute("UPDATE topics SET name = ? WHERE id = ?", (new, old_id))
+            self._topic_ids[new] = self._topic_ids.pop(old)
+            return []
+
+        with self.db:
+            conflicts = self.db.execute(
+                "SELECT a.eng_word, a.ukr_word, b.ukr_word FROM words a JOIN words b "
+                "ON b.topic_id = ? AND b.eng_word = a.eng_word WHERE a.topic_id = ? AND a.ukr_word != b.ukr_word",
+                (new_id, old_id),
+            ).fetchall()
+            self.db.execute(
+                "DELETE FROM words WHERE topic_id = ? AND eng_word IN (SELECT eng_word FROM words WHERE topic_id = ?)",
+                (new_id, old_id),
+            )
+            self.db.execute("UPDATE words SET topic_id = ? WHERE topic_id = ?", (new_id, old_id))
+            self.db.execute("DELETE FROM topics WHERE id = ?", (old_id,))
+        del self._topic_ids[old]
+        return conflicts
+
+    def duplicates(self):
+        """
+        Return the Ukranian words which have several English translations in
+        one topic (in the direction Ukranian -> English only the last one
+        could be practiced): a list of (topic, ukr_word, [eng_words]).
+        They are only reported: the English words are usually real synonyms
+        ("layout" and "mockup" -> "макет") and each of them is a card of the
+        direction English -> Ukranian, so they are fixed by hand if at all.
+        """
+        rows = self.db.execute(
+            "SELECT t.name, w.ukr_word, group_concat(w.eng_word, char(31)) FROM words w "
+            "JOIN topics t ON t.id = w.topic_id GROUP BY w.topic_id, w.ukr_word HAVING count(*) > 1"
+        ).fetchall()
+        return [(topic, ukr_word, eng_words.split("\x1f")) for topic, ukr_word, eng_words in rows]
+
+    def import_csv(self, file, batch_size=10000, on_progress=None, on_error=None):
+        """
+        Import the CSV file (the format of data/WordCards.csv) in batches.
+        Returns the report of upsert() for the whole file.
+        """
+        total = {"inserted": 0, "updated": 0, "unchanged": 0, "conflicts": []}
+        batches = iter_row_batches(file, batch_size, on_progress, on_error)
+        next(batches, None)  # The column positions are not needed
+        for batch in batches:
+            report = self.upsert((eng_word, ukr_word, topic) for eng_word, ukr_word, topic, _ in batch)
+            for key in ("inserted", "updated", "unchanged"):
+                total[key] += report[key]
+            total["conflicts"].extend(report["conflicts"])
+        return total
+
+    def export_csv(self, file):
+        """
+        Write all the words into the CSV file, grouped by topic.
+        """
+        with open(file, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["eng_word", "ukr_word", "topic"])
+            writer.writerows(self.db.execute(
+                "SELECT w.eng_word, w.ukr_word, t.name FROM words w JOIN topics t ON t.id = w.topic_id ORDER BY t.id, w.id"
+            ))
+
+    # The same reading interface as data_handler.TopicCatalog
+
+    def names(self):
+        """
+        Return the sorted list of the topics which have words.
+        """
+        return [name for (name,) in self.db.execute(
+            "SELECT name FROM topics WHERE id IN (SELECT DISTINCT topic_id FROM words) ORDER BY name"
+        )]
+
+    def __contains__(self, topic):
+        return topic in self._topic_ids
+
+    def __len__(self):
+        return len(self._topic_ids)
+
+    def _pairs(self, topic):
+        topic_id = self._topic_ids[topic]  # KeyError for unknown topics
+        return self.db.execute("SELECT eng_word, ukr_word FROM words WHERE topic_id = ? ORDER BY id", (topic_id,))
+
+    def english_to_ukranian(self, topic):
+        """
+        Return the dictionary English word -> Ukranian word of the topic.
+        """
+        return dict(self._pairs(topic))
+
+    def ukranian_to_english(self, topic):
+        """
+        Return the dictionary Ukranian word -> English word of the topic.
+        """
+        return {ukr_word: eng_word for eng_word, ukr_word in self._pairs(topic)}
+
+
+def main(argv=None):
+    """
+    Command line interface of the module.
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(description="WordCards vocabulary store")
+    commands = parser.add_subparsers(dest="command", required=True)
+    cmd = commands.add_parser("import", help="import a CSV file into the store")
+    cmd.add_argument("csv_file")
+    cmd.add_argument("store")
+    cmd = commands.add_parser("export", help="export the store into a CSV file")
+    cmd.add_argument("store")
+    cmd.add_argument("csv_file")
+    cmd = commands.add_parser("add", help="add or update one word")
+    cmd.add_argument("store")
+    cmd.add_argument("eng_word")
+    cmd.add_argument("ukr_word")
+    cmd.add_argument("topic")
+    cmd = commands.add_parser("remove", help="remove one word")
+    cmd.add_argument("store")
+    cmd.add_argument("eng_word")
+    cmd.add_argument("topic")
+    cmd = commands.add_parser("remove-topic", help="remove a topic with all its words")
+    cmd.add_argument("store")
+    cmd.add_argument("topic")
+    cmd = commands.add_parser("rename-topic", help="rename (or merge) a topic")
+    cmd.add_argument("store")
+    cmd.add_argument("old")
+    cmd.add_argument("new")
+    cmd = commands.add_parser("dedupe", help="list the Ukranian words repeated in a topic")
+    cmd.add_argument("store")
+    args = parser.parse_args(argv)
+
+    if args.command == "import":
+        store = VocabStore(args.store)
+        report = store.import_csv(args.csv_file)
+        print(f"{report['inserted']} inserted, {report['updated']} updated, {report['unchanged']} unchanged")
+        for topic, eng_word, old, new in report["conflicts"]:
+            print(f"conflict in {topic!r}: {eng_word!r} was {old!r}, now {new!r}")
+    elif args.command == "export":
+        VocabStore(args.store).export_csv(args.csv_file)
+    elif args.command == "add":
+        report = VocabStore(args.store).upsert([(args.eng_word, args.ukr_word, args.topic)])
+        for topic, eng_word, old, new in report["conflicts"]:
+            print(f"{eng_word!r} in {topic!r} was {old!r}, now {new!r}")
+    elif args.command == "remove":
+        print(f"{VocabStore(args.store).delete([(args.eng_word, args.topic)])} words removed")
+    elif args.command == "remove-topic":
+        print(f"{VocabStore(args.store).delete_topic(args.topic)} words removed")
+    elif args.command == "rename-topic":
+        for eng_word, kept, dropped in VocabStore(args.store).rename_topic(args.old, args.new):
+            print(f"conflict: {eng_word!r} kept {kept!r}, dropped {dropped!r}")
+    elif args.command == "dedupe":
+        store = VocabStore(args.store)
+        duplicates = store.duplicates()
+        for topic, ukr_word, eng_words in duplicates:
+            print(f"{topic!r}: {ukr_word!r} <- {', '.join(eng_words)}")
+        print(f"{len(duplicates)} duplicates")
+
+
+if __name__ == "__main__":
+    main()